@@ -0,0 +1,178 @@
+"""
+Benchmark dos crawlers contra um servidor local que imita o LinkedIn e o Instagram.
+
+Não requer rede nem contas reais, apenas o Firefox e o Geckodriver.
+
+Examples
+--------
+python -m pra_todos_verem.data_collection.bench \
+    --website linkedin,instagram \
+    --configurations baseline,pipeline,batch,lean \
+    --max_downloads 50 \
+    --headless \
+    --output bench_crawlers.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from pra_todos_verem.data_collection import instagram, linkedin
+from pra_todos_verem.data_collection.fake_server import FakeServer, FakeSocialNetwork
+from pra_todos_verem.data_collection.rate_limit import RateLimiter
+
+DESCRIPTION = "Benchmark dos crawlers em um servidor local, sem rede"
+
+# parâmetros dos crawlers comparados no benchmark
+CONFIGURATIONS = {
+    "baseline": {},
+    "pipeline": {"pipeline_workers": 2},
+    "batch": {"pipeline_workers": 2, "batch_extraction": True},
+    "lean": {"pipeline_workers": 2, "batch_extraction": True, "lean": True},
+}
+
+CRAWLERS = {
+    "linkedin": linkedin.LinkedInCrawler,
+    "instagram": instagram.InstagramCrawler,
+}
+
+
+def benchmark(
+    website: str,
+    configuration: str,
+    network: FakeSocialNetwork,
+    max_downloads: int,
+    headless: bool,
+) -> Dict:
+    """
+    Executa um crawler contra o servidor local e mede o seu desempenho.
+
+    Parameters
+    ----------
+    website : str
+    configuration : str
+        Uma das chaves de CONFIGURATIONS.
+    network : FakeSocialNetwork
+    max_downloads : int
+    headless : bool
+
+    Returns
+    -------
+    dict
+        Publicações por segundo, MB/s baixados e o resumo das métricas do crawler.
+    """
+    # o servidor local aceita qualquer usuário e senha
+    os.environ.setdefault(f"{website.upper()}_USERNAME", "benchmark")
+    os.environ.setdefault(f"{website.upper()}_PASSWORD", "benchmark")
+
+    with tempfile.TemporaryDirectory() as save_path, FakeServer(network) as server:
+        crawler = CRAWLERS[website](
+            query="PraTodosVerem",
+            save_path=save_path,
+            headless=headless,
+            max_downloads=max_downloads,
+            stop_after_known=0,
+            base_url=server.url,
+            # sem limites de requisições: o servidor local não precisa ser poupado, e o benchmark mede o pipeline
+            rate_limiter=RateLimiter(unlimited=True),
+            **CONFIGURATIONS[configuration],
+        )
+
+        start = time.perf_counter()
+        crawler.run()
+        elapsed = time.perf_counter() - start
+
+        posts = [
+            entry.path
+            for entry in os.scandir(crawler.save_path)
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+        total_bytes = sum(
+            entry.stat().st_size
+            for post in posts
+            for entry in os.scandir(post)
+            if not entry.name.endswith((".txt", ".json"))
+        )
+
+    return {
+        "website": website,
+        "configuration": configuration,
+        "posts": len(posts),
+        "elapsed": elapsed,
+        "posts_per_second": len(posts) / elapsed,
+        "megabytes_per_second": total_bytes / 1e6 / elapsed,
+        "metrics": crawler.metrics.summary(),
+    }
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--website",
+        type=str,
+        default="linkedin,instagram",
+        help="Websites, separados por vírgula",
+    )
+    parser.add_argument(
+        "--configurations",
+        type=str,
+        default=",".join(CONFIGURATIONS),
+        help=f"Configurações dos crawlers, separadas por vírgula. Opções: {', '.join(CONFIGURATIONS)}",
+    )
+    parser.add_argument(
+        "--num_posts",
+        type=int,
+        default=100,
+        help="Total de publicações servidas pelo servidor local",
+    )
+    parser.add_argument(
+        "--max_downloads",
+        type=int,
+        default=50,
+        help="Total de publicações visitadas",
+    )
+    parser.add_argument(
+        "--image_size",
+        type=int,
+        default=512,
+        help="Largura e altura das imagens servidas, em pixels",
+    )
+    parser.add_argument("--headless", action="count", help="Habilita headless browsing")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Arquivo JSON onde salvar os resultados",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    network = FakeSocialNetwork(num_posts=args.num_posts, image_size=args.image_size)
+
+    results = []
+    for website in args.website.split(","):
+        for configuration in args.configurations.split(","):
+            result = benchmark(website, configuration, network, args.max_downloads, args.headless)
+            results.append(result)
+
+    print(f"{'website':<10} {'configuration':<14} {'posts':>6} {'posts/s':>8} {'MB/s':>8}")
+    for result in results:
+        print(
+            f"{result['website']:<10} {result['configuration']:<14} {result['posts']:>6} "
+            f"{result['posts_per_second']:>8.2f} {result['megabytes_per_second']:>8.2f}"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,63 @@
+"""
+Criação do navegador (Firefox) usado pelos crawlers.
+"""
+from typing import Optional
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+
+# preferências do Firefox que evitam carregar mídias que os crawlers baixam novamente com requests.
+# as URLs continuam disponíveis nos atributos src/poster do DOM.
+LEAN_PREFERENCES = {
+    # não carrega imagens
+    "permissions.default.image": 2,
+    # não reproduz nem pré-carrega vídeos e áudios
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "media.preload.default": 0,
+    "media.preload.auto": 0,
+    # não baixa fontes web
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    # não faz prefetch de links e DNS
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+    # menos processos de conteúdo, menos memória por sessão
+    "dom.ipc.processCount": 1,
+}
+
+
+def create_browser(
+    headless: bool = False,
+    lean: bool = False,
+    profile_path: Optional[str] = None,
+) -> webdriver.Firefox:
+    """
+    Abre uma instância do Firefox controlada pelo Selenium WebDriver.
+
+    Parameters
+    ----------
+    headless : bool
+        Permite rodar a automação em um processo de CI, sem um display.
+    lean : bool
+        Bloqueia imagens, vídeos, fontes web e prefetch, reduzindo a latência e a memória por sessão.
+    profile_path : str, optional
+        Diretório de um perfil persistente do Firefox. Se None, um perfil temporário é criado.
+
+    Returns
+    -------
+    selenium.webdriver.Firefox
+    """
+    options = Options()
+    options.headless = headless
+
+    if lean:
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+
+    if profile_path is not None:
+        options.add_argument("-profile")
+        options.add_argument(profile_path)
+
+    return webdriver.Firefox(options=options)
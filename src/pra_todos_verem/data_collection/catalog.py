@@ -0,0 +1,333 @@
+"""
+Catálogo SQLite com os metadados das publicações coletadas.
+
+Os crawlers registram cada publicação salva. O catálogo também pode ser preenchido a partir
+das pastas já coletadas:
+
+Examples
+--------
+python -m pra_todos_verem.data_collection.catalog --root data/raw/
+
+sqlite3 data/raw/.catalog.sqlite "SELECT author, COUNT(*) FROM posts GROUP BY author ORDER BY 2 DESC"
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.request import pathname2url
+
+from PIL import Image
+
+DESCRIPTION = "Registra as publicações já coletadas no catálogo SQLite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    source TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    author TEXT,
+    caption TEXT,
+    timestamp TEXT,
+    collected_at TEXT NOT NULL,
+    PRIMARY KEY (source, post_id)
+);
+CREATE TABLE IF NOT EXISTS images (
+    source TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    url TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    width INTEGER,
+    height INTEGER,
+    PRIMARY KEY (source, post_id, filename)
+);
+CREATE INDEX IF NOT EXISTS posts_author ON posts (author);
+CREATE INDEX IF NOT EXISTS posts_timestamp ON posts (timestamp);
+"""
+
+
+def post_timestamp(source: str, post_id: str) -> Optional[str]:
+    """
+    Data de publicação (ISO 8601, UTC) a partir do id da publicação.
+
+    No LinkedIn, os 41 bits mais significativos do id da atividade são o timestamp em milissegundos.
+    No Instagram, o id é a própria data (%Y%m%d%H%M).
+
+    Parameters
+    ----------
+    source : str
+    post_id : str
+
+    Returns
+    -------
+    str, optional
+    """
+    try:
+        if source == "linkedin":
+            post_datetime = datetime.fromtimestamp((int(post_id) >> 22) / 1000, tz=timezone.utc)
+        elif source == "instagram":
+            post_datetime = datetime.strptime(post_id, "%Y%m%d%H%M").replace(tzinfo=timezone.utc)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    return post_datetime.isoformat()
+
+
+def image_dimensions(filepath: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Largura e altura de uma imagem, lidas do cabeçalho do arquivo.
+
+    Parameters
+    ----------
+    filepath : str
+
+    Returns
+    -------
+    tuple
+        (None, None) se o PIL não consegue abrir o arquivo (ex: svg).
+    """
+    try:
+        with Image.open(filepath) as image:
+            return image.size
+    except OSError:
+        return None, None
+
+
+class Catalog:
+    """
+    Tabelas posts e images em um banco SQLite, em modo WAL.
+
+    As publicações são acumuladas em memória e gravadas em uma única transação a cada batch_size
+    publicações (e em flush/close). O modo WAL permite ler o catálogo enquanto os crawlers escrevem,
+    e vários processos podem escrever no mesmo arquivo.
+
+    Examples
+    --------
+    catalog = Catalog("data/raw/.catalog.sqlite")
+    catalog.add_post("linkedin", post_id, author, caption, images)
+    catalog.close()
+    """
+
+    def __init__(self, path: str, root: Optional[str] = None, batch_size: int = 32, read_only: bool = False):
+        """
+        Parameters
+        ----------
+        path : str
+            Arquivo do banco.
+        root : str, optional
+            Diretório base dos caminhos das imagens. Default: o diretório do banco.
+        batch_size : int
+            Publicações por transação.
+        read_only : bool
+            Abre um banco existente apenas para leitura, sem criar as tabelas (ex: o dataset).
+        """
+        self.path = path
+        self.root = root if root is not None else os.path.dirname(path)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+
+        if read_only:
+            self.connection = sqlite3.connect(
+                f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, check_same_thread=False
+            )
+            return
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # timeout: tempo de espera quando outro processo está escrevendo
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def add_post(self, source: str, post_id: str, author: str, caption: str, images: List[Dict]):
+        """
+        Registra uma publicação. Uma publicação já registrada é substituída.
+
+        Parameters
+        ----------
+        source : str
+        post_id : str
+        author : str
+        caption : str
+        images : list of dict
+            Com as chaves filename, path (relativo a root), url, size, sha256, width e height.
+        """
+        collected_at = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self.pending.append(
+                (
+                    (source, post_id, author, caption, post_timestamp(source, post_id), collected_at),
+                    [
+                        (
+                            source,
+                            post_id,
+                            image["filename"],
+                            image["path"],
+                            image.get("url"),
+                            image.get("size"),
+                            image.get("sha256"),
+                            image.get("width"),
+                            image.get("height"),
+                        )
+                        for image in images
+                    ],
+                )
+            )
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        """
+        Grava as publicações pendentes em uma transação.
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+
+        with self.connection:
+            for post, images in self.pending:
+                self.connection.execute("DELETE FROM images WHERE source = ? AND post_id = ?", post[:2])
+                self.connection.execute("INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?)", post)
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", images
+                )
+        self.pending = []
+
+    def close(self):
+        """
+        Grava as publicações pendentes e fecha o banco.
+        """
+        self.flush()
+        self.connection.close()
+
+    def read_posts(self) -> List[Dict]:
+        """
+        Todas as publicações e suas imagens, em uma única consulta, ordenadas por fonte e id.
+
+        Returns
+        -------
+        list of dict
+            Com as chaves source, post_id, author, caption, timestamp, collected_at e images
+            (lista de dicts com as chaves filename, path, url, size, sha256, width e height).
+        """
+        self.flush()
+        rows = self.connection.execute(
+            """
+            SELECT p.source, p.post_id, p.author, p.caption, p.timestamp, p.collected_at,
+                   i.filename, i.path, i.url, i.size, i.sha256, i.width, i.height
+            FROM posts p LEFT JOIN images i ON i.source = p.source AND i.post_id = p.post_id
+            ORDER BY p.source, p.post_id, LENGTH(i.filename), i.filename
+            """
+        )
+
+        posts = []
+        for row in rows:
+            if not posts or (posts[-1]["source"], posts[-1]["post_id"]) != row[:2]:
+                posts.append(
+                    dict(zip(("source", "post_id", "author", "caption", "timestamp", "collected_at"), row[:6]))
+                )
+                posts[-1]["images"] = []
+            if row[6] is not None:
+                posts[-1]["images"].append(
+                    dict(zip(("filename", "path", "url", "size", "sha256", "width", "height"), row[6:]))
+                )
+        return posts
+
+    def import_folder(self, source: str, post_path: str):
+        """
+        Registra uma pasta de publicação já salva (imagens, caption.txt, author.txt e images.json).
+
+        Parameters
+        ----------
+        source : str
+        post_path : str
+        """
+        def read_text(filename: str) -> str:
+            filepath = os.path.join(post_path, filename)
+            if not os.path.exists(filepath):
+                return ""
+            with open(filepath, "r") as file:
+                return file.read()
+
+        downloads = {}
+        if os.path.exists(os.path.join(post_path, "images.json")):
+            with open(os.path.join(post_path, "images.json"), "r") as file:
+                downloads = {image["filename"]: image for image in json.load(file)}
+
+        images = []
+        for entry in os.scandir(post_path):
+            if entry.name.endswith((".txt", ".json")) or entry.name.startswith("."):
+                continue
+
+            image = downloads.get(entry.name)
+            if image is None:
+                with open(entry.path, "rb") as file:
+                    image = {"size": entry.stat().st_size, "sha256": hashlib.sha256(file.read()).hexdigest()}
+
+            width, height = image_dimensions(entry.path)
+            images.append(
+                {
+                    "filename": entry.name,
+                    "path": os.path.relpath(entry.path, self.root),
+                    "url": image.get("url"),
+                    "size": image["size"],
+                    "sha256": image["sha256"],
+                    "width": width,
+                    "height": height,
+                }
+            )
+
+        self.add_post(source, os.path.basename(post_path), read_text("author.txt"), read_text("caption.txt"), images)
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default="data/raw/",
+        help="Diretório dos dados 'raw'",
+    )
+    parser.add_argument(
+        "--catalog_path",
+        type=str,
+        default=None,
+        help="Arquivo do catálogo. Default: <root>/.catalog.sqlite",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    catalog_path = args.catalog_path if args.catalog_path is not None else os.path.join(args.root, ".catalog.sqlite")
+    catalog = Catalog(catalog_path, root=args.root, batch_size=256)
+
+    total = 0
+    for source in os.scandir(args.root):
+        if not source.is_dir() or source.name.startswith("."):
+            continue
+
+        for post in os.scandir(source.path):
+            if post.is_dir() and not post.name.startswith("."):
+                catalog.import_folder(source.name, post.path)
+                total += 1
+
+    catalog.close()
+    print(f"Registered {total} posts in {catalog_path}")
@@ -0,0 +1,195 @@
+"""
+Checkpoint da coleta: publicações já coletadas e fronteira da última coleta.
+"""
+import json
+import os
+import threading
+from typing import Optional
+
+
+class Checkpoint:
+    """
+    Registra as publicações já coletadas e a última publicação visitada (fronteira), em um arquivo JSON.
+
+    Permite que uma nova coleta:
+    - ignore as publicações já coletadas, sem fazer downloads;
+    - pare assim que encontrar uma sequência de publicações já coletadas;
+    - continue de onde parou, caso a coleta anterior tenha sido interrompida.
+      Neste caso, a parada antecipada só é permitida após passar pela fronteira.
+
+    Examples
+    --------
+    checkpoint = Checkpoint("data/raw/linkedin/.checkpoint-pratodosverem.json", "data/raw/linkedin/")
+    checkpoint.start()
+    if checkpoint.visit(post_id):
+        ...  # salva a publicação
+        checkpoint.add(post_id)
+    checkpoint.finish()
+    """
+
+    def __init__(self, path: str, data_path: Optional[str] = None, save_every: int = 20):
+        """
+        Parameters
+        ----------
+        path : str
+            Arquivo JSON do checkpoint.
+        data_path : str, optional
+            Diretório com uma pasta por publicação coletada. As pastas existentes são consideradas coletadas.
+        save_every : int
+            O arquivo é reescrito a cada save_every visitas ou publicações coletadas (e em start/finish), e não
+            a cada uma: o arquivo tem todas as publicações coletadas. Numa interrupção, as publicações coletadas
+            desde o último save continuam em data_path, e a coleta retoma um pouco antes da fronteira.
+        """
+        self.path = path
+        self.save_every = save_every
+        self.changes = 0
+        self.seen = set()
+        self.frontier = None
+        self.finished = True
+
+        self.resume_from = None
+        self.known_in_a_row = 0
+        self.lock = threading.Lock()
+
+        self.load()
+
+        if data_path is not None and os.path.isdir(data_path):
+            self.seen.update(
+                entry.name
+                for entry in os.scandir(data_path)
+                if entry.is_dir() and not entry.name.startswith(".")
+            )
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self.seen
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def load(self):
+        """
+        Lê o arquivo do checkpoint, se existir.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as file:
+            state = json.load(file)
+
+        self.seen = set(state["seen"])
+        self.frontier = state["frontier"]
+        self.finished = state["finished"]
+
+    def save(self):
+        """
+        Escreve o checkpoint em um arquivo temporário e o renomeia, para não corromper o arquivo em caso de falha.
+        """
+        state = {
+            "seen": sorted(self.seen),
+            "frontier": self.frontier,
+            "finished": self.finished,
+        }
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state, file)
+        os.replace(tmp_path, self.path)
+        self.changes = 0
+
+    def changed(self):
+        """
+        Conta uma alteração e salva o checkpoint a cada save_every alterações. Chamado com o lock adquirido.
+        """
+        self.changes += 1
+        if self.changes >= self.save_every:
+            self.save()
+
+    def start(self):
+        """
+        Inicia uma coleta. Se a coleta anterior foi interrompida, retoma a partir da sua fronteira.
+        """
+        with self.lock:
+            self.resume_from = None if self.finished else self.frontier
+            self.known_in_a_row = 0
+            self.finished = False
+            self.save()
+
+        if self.resume_from is not None:
+            print(f"Resuming interrupted crawl from post {self.resume_from}")
+
+    def visit(self, post_id: str) -> bool:
+        """
+        Registra a visita a uma publicação e avança a fronteira.
+
+        Parameters
+        ----------
+        post_id : str
+
+        Returns
+        -------
+        bool
+            True se a publicação ainda não foi coletada.
+        """
+        with self.lock:
+            if post_id == self.resume_from:
+                self.resume_from = None
+
+            # enquanto não alcança a fronteira da coleta interrompida, ela é mantida
+            if self.resume_from is None:
+                self.frontier = post_id
+                self.changed()
+
+            if post_id in self.seen:
+                self.known_in_a_row += 1
+                return False
+
+            self.known_in_a_row = 0
+            return True
+
+    def should_stop(self, stop_after_known: int) -> bool:
+        """
+        Indica se a coleta alcançou as publicações já coletadas.
+
+        Parameters
+        ----------
+        stop_after_known : int
+            Total de publicações já coletadas, em sequência, para parar. 0 desabilita.
+
+        Returns
+        -------
+        bool
+        """
+        return (
+            stop_after_known > 0
+            and self.resume_from is None
+            and self.known_in_a_row >= stop_after_known
+        )
+
+    def add(self, post_id: str):
+        """
+        Marca uma publicação como coletada.
+
+        Parameters
+        ----------
+        post_id : str
+        """
+        with self.lock:
+            self.seen.add(post_id)
+            self.changed()
+
+    def flush(self):
+        """
+        Salva as alterações desde o último save (ex: ao encerrar uma coleta interrompida por um erro).
+        """
+        with self.lock:
+            if self.changes:
+                self.save()
+
+    def finish(self):
+        """
+        Marca a coleta como concluída. A próxima coleta começa do início do feed.
+        """
+        with self.lock:
+            self.finished = True
+            self.save()
@@ -2,40 +2,122 @@
 Ferramenta de coleta de imagens em publicações #PraTodosVerem.
 """
 import argparse
+import multiprocessing
+import os
 import sys
+from typing import Optional
 
 from pra_todos_verem.data_collection import instagram, linkedin
+from pra_todos_verem.data_collection.daemon import CrawlDaemon
 
 
 DESCRIPTION = "Ferramenta de coleta de imagens em publicações #PraTodosVerem"
 
 
-def collect(website: str, query: str, output_path: str, headless: bool, max_downloads: int):
+def collect(
+    website: str,
+    query: str,
+    output_path: str,
+    headless: bool,
+    max_downloads: int,
+    download_threads: int = 4,
+    pipeline_workers: int = 0,
+    batch_extraction: bool = False,
+    stop_after_known: int = 5,
+    workers: int = 1,
+    lean: bool = False,
+    session_path: Optional[str] = None,
+    metrics_path: Optional[str] = None,
+    dedup: bool = False,
+    daemon: bool = False,
+    interval: float = 3600,
+    status_path: Optional[str] = None,
+):
     """
     Coleta imagens em publicações com Selenium WebDriver.
 
     Parameters
     ----------
     website : str
+        Com daemon=True, um ou mais websites, separados por vírgula.
     query : str
+        Uma ou mais queries, separadas por vírgula.
     output_path : str
     headless : bool
     max_downloads : int
+        Total de publicações visitadas por query.
+    download_threads : int
+    pipeline_workers : int
+    batch_extraction : bool
+    stop_after_known : int
+    workers : int
+        Total de processos, cada um com seu próprio navegador. As queries são divididas entre eles.
+    lean : bool
+    session_path : str, optional
+        Diretório onde salvar o perfil do Firefox e os cookies, reaproveitados entre execuções.
+    metrics_path : str, optional
+        Arquivo JSONL onde registrar a duração de cada fase da coleta.
+    dedup : bool
+        Descarta imagens quase idênticas a imagens já coletadas (ver dedup.py).
+    daemon : bool
+        Coleta contínua: mantém um navegador autenticado por website e repete a coleta a cada interval segundos
+        (ver daemon.py). workers é ignorado.
+    interval : float
+        Segundos entre o início de duas passadas do daemon.
+    status_path : str, optional
+        Arquivo JSON com o estado do daemon. Default: <output_path>/.daemon-status.json
     """
-    if website.lower() == "instagram":
-        instagram.InstagramCrawler(
-            query=query,
-            save_path=output_path,
-            headless=headless,
-            max_downloads=max_downloads,
+    queries = [q.strip() for q in query.split(",") if q.strip()]
+    crawler_kwargs = dict(
+        save_path=output_path,
+        headless=headless,
+        max_downloads=max_downloads,
+        download_threads=download_threads,
+        pipeline_workers=pipeline_workers,
+        batch_extraction=batch_extraction,
+        stop_after_known=stop_after_known,
+        lean=lean,
+        session_path=session_path,
+        metrics_path=metrics_path,
+        dedup=dedup,
+    )
+
+    if daemon:
+        CrawlDaemon(
+            [w.strip() for w in website.split(",") if w.strip()],
+            queries,
+            interval=interval,
+            status_path=status_path if status_path is not None else os.path.join(output_path, ".daemon-status.json"),
+            crawler_kwargs=crawler_kwargs,
         ).run()
+        return
+
+    if workers > len(queries):
+        print(f"Only {len(queries)} queries for {workers} workers. Using {len(queries)} workers...")
+
+    if workers > 1 and len(queries) > 1:
+        with multiprocessing.Pool(processes=min(workers, len(queries))) as pool:
+            pool.starmap(run_crawler, [(website, q, crawler_kwargs) for q in queries])
+    else:
+        for q in queries:
+            run_crawler(website, q, crawler_kwargs)
+
+
+def run_crawler(website: str, query: str, crawler_kwargs: dict):
+    """
+    Cria e executa o crawler de um website para uma query.
+
+    Parameters
+    ----------
+    website : str
+    query : str
+    crawler_kwargs : dict
+        Demais parâmetros do crawler.
+    """
+    if website.lower() == "instagram":
+        instagram.InstagramCrawler(query=query, **crawler_kwargs).run()
     elif website.lower() == "linkedin":
-        linkedin.LinkedInCrawler(
-            query=query,
-            save_path=output_path,
-            headless=headless,
-            max_downloads=max_downloads,
-        ).run()
+        linkedin.LinkedInCrawler(query=query, **crawler_kwargs).run()
 
 
 def parse_args(args):
@@ -55,7 +137,7 @@ def parse_args(args):
         "--query",
         type=str,
         default="PraTodosVerem",
-        help="Query de busca",
+        help="Query de busca. Várias queries podem ser separadas por vírgula",
     )
     parser.add_argument(
         "--output_path",
@@ -64,16 +146,102 @@ def parse_args(args):
         help="Diretório onde salvar os dados 'raw' (imagens e textos)",
     )
     parser.add_argument("--headless", action="count", help="Habilita headless browsing")
+    parser.add_argument(
+        "--lean",
+        action="count",
+        help="Não carrega imagens, vídeos e fontes no navegador (as imagens são baixadas à parte)",
+    )
     parser.add_argument(
         "--max_downloads",
         type=int,
         default=5,
         help="Total de publicações visitadas",
     )
+    parser.add_argument(
+        "--download_threads",
+        type=int,
+        default=4,
+        help="Total de imagens de uma publicação baixadas em paralelo",
+    )
+    parser.add_argument(
+        "--pipeline_workers",
+        type=int,
+        default=0,
+        help="Total de threads que salvam as publicações em segundo plano, enquanto o navegador segue para a próxima. 0 desabilita",
+    )
+    parser.add_argument(
+        "--batch_extraction",
+        action="count",
+        help="Extrai os dados das publicações com uma única chamada ao WebDriver",
+    )
+    parser.add_argument(
+        "--stop_after_known",
+        type=int,
+        default=5,
+        help="Interrompe a coleta após encontrar essa quantidade de publicações já coletadas, em sequência. 0 desabilita",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Total de navegadores em processos separados. As queries são divididas entre eles",
+    )
+    parser.add_argument(
+        "--session_path",
+        type=str,
+        default=None,
+        help="Diretório onde salvar o perfil do navegador e os cookies, para evitar o logon nas próximas execuções",
+    )
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        default=None,
+        help="Arquivo JSONL onde registrar a duração de cada fase da coleta",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="count",
+        help="Descarta imagens quase idênticas a imagens já coletadas (em qualquer website)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="count",
+        help="Coleta contínua: mantém um navegador autenticado por website e repete a coleta a cada --interval segundos",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=3600,
+        help="Segundos entre o início de duas passadas do daemon",
+    )
+    parser.add_argument(
+        "--status_path",
+        type=str,
+        default=None,
+        help="Arquivo JSON com o estado do daemon (fila, publicações por minuto). Default: <output_path>/.daemon-status.json",
+    )
     return parser.parse_args(args)
 
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
 
-    collect(args.website, args.query, args.output_path, args.headless, args.max_downloads)
+    collect(
+        args.website,
+        args.query,
+        args.output_path,
+        args.headless,
+        args.max_downloads,
+        args.download_threads,
+        args.pipeline_workers,
+        args.batch_extraction,
+        args.stop_after_known,
+        args.workers,
+        args.lean,
+        args.session_path,
+        args.metrics_path,
+        args.dedup,
+        args.daemon,
+        args.interval,
+        args.status_path,
+    )
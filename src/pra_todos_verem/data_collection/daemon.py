@@ -0,0 +1,312 @@
+"""
+Coleta contínua: um navegador autenticado por website, que visita as hashtags periodicamente.
+
+Examples
+--------
+python -m pra_todos_verem.data_collection.collect \
+    --daemon \
+    --website linkedin,instagram \
+    --query PraTodosVerem,PraCegoVer \
+    --interval 3600 \
+    --headless
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pra_todos_verem.data_collection import instagram, linkedin
+
+CRAWLERS = {
+    "instagram": instagram.InstagramCrawler,
+    "linkedin": linkedin.LinkedInCrawler,
+}
+
+
+def isoformat(timestamp: Optional[float]) -> Optional[str]:
+    """
+    Data (ISO 8601, UTC) de um timestamp.
+    """
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class CrawlDaemon:
+    """
+    Mantém um crawler (e o seu navegador) por website, autenticado uma única vez, e repete a coleta
+    de todas as queries a cada interval segundos.
+
+    Cada website roda em uma thread. Os checkpoints das queries fazem com que apenas as publicações novas
+    sejam salvas, e stop_after_known encerra cada passada ao alcançar as publicações da passada anterior.
+    Se a passada falhar (ex: sessão expirada, navegador travado), o crawler é recriado, com um novo navegador,
+    e o logon é refeito na passada seguinte. O índice de hashes e o catálogo são salvos ao final de cada passada.
+
+    O estado da coleta é escrito em status_path (JSON) a cada status_interval segundos: para cada website,
+    a fila de publicações a salvar, as publicações salvas, publicações por minuto e o horário da próxima passada.
+
+    Examples
+    --------
+    daemon = CrawlDaemon(["linkedin"], ["PraTodosVerem"], interval=3600, crawler_kwargs={"save_path": "data/raw/"})
+    daemon.run()
+    """
+
+    def __init__(
+        self,
+        websites: List[str],
+        queries: List[str],
+        interval: float = 3600,
+        status_path: Optional[str] = None,
+        status_interval: float = 10,
+        crawler_kwargs: Optional[Dict] = None,
+    ):
+        """
+        Parameters
+        ----------
+        websites : list of str
+        queries : list of str
+        interval : float
+            Segundos entre o início de duas passadas. Uma passada mais longa que interval emenda na seguinte.
+        status_path : str, optional
+            Arquivo JSON com o estado da coleta.
+        status_interval : float
+            Segundos entre duas escritas do estado.
+        crawler_kwargs : dict, optional
+            Demais parâmetros dos crawlers (ex: save_path, headless, max_downloads).
+        """
+        self.websites = [website.lower() for website in websites]
+        self.queries = queries
+        self.interval = interval
+        self.status_path = status_path
+        self.status_interval = status_interval
+        self.crawler_kwargs = crawler_kwargs if crawler_kwargs is not None else {}
+
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.crawlers = {}
+        # publicações salvas pelos crawlers já fechados (ex: após uma falha do navegador)
+        self.closed_posts = {website: 0 for website in self.websites}
+        self.dedup_index = None
+        self.states = {
+            website: {
+                "state": "starting",
+                "query": None,
+                "passes": 0,
+                "errors": 0,
+                "last_pass": None,
+                "next_pass_at": None,
+            }
+            for website in self.websites
+        }
+
+    def run(self, max_passes: Optional[int] = None):
+        """
+        Inicia uma thread por website e escreve o estado periodicamente, até stop() (ou Ctrl+C).
+
+        Parameters
+        ----------
+        max_passes : int, optional
+            Encerra após esse total de passadas por website. Default: sem limite.
+        """
+        threads = [
+            threading.Thread(target=self.run_website, args=(website, max_passes), daemon=True)
+            for website in self.websites
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                self.write_status()
+                deadline = time.time() + self.status_interval
+                for thread in threads:
+                    thread.join(timeout=max(0.0, deadline - time.time()))
+        except KeyboardInterrupt:
+            print("Stopping after the current pass...")
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+        self.write_status()
+
+    def stop(self):
+        """
+        Encerra a coleta. As passadas em andamento são concluídas.
+        """
+        self.stopped.set()
+
+    def run_website(self, website: str, max_passes: Optional[int] = None):
+        """
+        Laço de coleta de um website: logon, uma passada por query e espera até a próxima passada.
+
+        Parameters
+        ----------
+        website : str
+        max_passes : int, optional
+        """
+        state = self.states[website]
+        crawler = None
+
+        try:
+            while not self.stopped.is_set():
+                pass_started_at = time.time()
+                posts = self.posts(website)
+                try:
+                    if crawler is None:
+                        self.update_state(website, state="logon")
+                        crawler = self.create_crawler(website)
+                        crawler.start()
+
+                    for query in self.queries:
+                        if self.stopped.is_set():
+                            break
+                        self.update_state(website, state="crawling", query=query)
+                        crawler.set_query(query)
+                        crawler.collect()
+                except Exception as e:
+                    print(e)
+                    print(f"Crawl of {website} failed. Restarting the browser on the next pass...")
+                    with self.lock:
+                        state["errors"] += 1
+
+                    # o navegador pode ter travado: um novo crawler abre outro navegador e refaz o logon
+                    if crawler is not None:
+                        self.close_crawler(website, crawler)
+                        crawler = None
+
+                # a cada passada, para não perder os hashes e publicações se o processo for interrompido
+                if crawler is not None:
+                    crawler.catalog.flush()
+                    if crawler.dedup_index is not None:
+                        crawler.dedup_index.save()
+
+                elapsed = time.time() - pass_started_at
+                new_posts = self.posts(website) - posts
+                with self.lock:
+                    state["passes"] += 1
+                    state["last_pass"] = {
+                        "started_at": isoformat(pass_started_at),
+                        "duration": elapsed,
+                        "posts": new_posts,
+                        "posts_per_minute": 60 * new_posts / elapsed if elapsed > 0 else 0.0,
+                    }
+                print(f"Pass {state['passes']} of {website}: {new_posts} new posts in {elapsed:.1f}s")
+
+                if max_passes is not None and state["passes"] >= max_passes:
+                    break
+
+                next_pass_at = pass_started_at + self.interval
+                self.update_state(website, state="sleeping", query=None, next_pass_at=isoformat(next_pass_at))
+                self.stopped.wait(max(0.0, next_pass_at - time.time()))
+        finally:
+            self.update_state(website, state="stopped", query=None, next_pass_at=None)
+            if crawler is not None:
+                self.close_crawler(website, crawler)
+
+    def create_crawler(self, website: str):
+        """
+        Cria o crawler (e o navegador) de um website.
+
+        Os crawlers compartilham o mesmo índice de hashes (dedup): com uma cópia por website, cada um
+        sobrescreveria o arquivo do índice com as suas entradas.
+
+        Parameters
+        ----------
+        website : str
+
+        Returns
+        -------
+        LinkedInCrawler or InstagramCrawler
+        """
+        crawler = CRAWLERS[website](query=self.queries[0], **self.crawler_kwargs)
+        with self.lock:
+            if crawler.dedup_index is not None:
+                if self.dedup_index is None:
+                    self.dedup_index = crawler.dedup_index
+                crawler.dedup_index = self.dedup_index
+            self.crawlers[website] = crawler
+        return crawler
+
+    def close_crawler(self, website: str, crawler):
+        """
+        Fecha o crawler de um website. As publicações salvas por ele continuam contadas em posts().
+
+        Parameters
+        ----------
+        website : str
+        crawler : LinkedInCrawler or InstagramCrawler
+        """
+        with crawler.metrics.lock:
+            posts = crawler.metrics.counters["posts"]
+        with self.lock:
+            self.closed_posts[website] += posts
+            del self.crawlers[website]
+
+        try:
+            crawler.finalize()
+        except Exception as e:
+            # o navegador pode já ter sido encerrado
+            print(e)
+
+    def update_state(self, website: str, **fields):
+        with self.lock:
+            self.states[website].update(fields)
+
+    def posts(self, website: str) -> int:
+        """
+        Total de publicações salvas pelo crawler de um website desde o início.
+        """
+        with self.lock:
+            crawler = self.crawlers.get(website)
+            posts = self.closed_posts[website]
+        if crawler is None:
+            return posts
+        with crawler.metrics.lock:
+            return posts + crawler.metrics.counters["posts"]
+
+    def status(self) -> Dict:
+        """
+        Estado da coleta.
+
+        Returns
+        -------
+        dict
+        """
+        elapsed = time.time() - self.started_at
+        websites = {}
+        for website in self.websites:
+            crawler = self.crawlers.get(website)
+            pipeline = crawler.pipeline if crawler is not None else None
+            posts = self.posts(website)
+            with self.lock:
+                websites[website] = {
+                    **self.states[website],
+                    # publicações extraídas pelo navegador que aguardam o download
+                    "queue_depth": pipeline.queue.qsize() if pipeline is not None else 0,
+                    "posts": posts,
+                    "posts_per_minute": 60 * posts / elapsed if elapsed > 0 else 0.0,
+                }
+
+        return {
+            "pid": os.getpid(),
+            "started_at": isoformat(self.started_at),
+            "updated_at": isoformat(time.time()),
+            "queries": self.queries,
+            "interval": self.interval,
+            "websites": websites,
+        }
+
+    def write_status(self):
+        """
+        Escreve o estado em status_path, atomicamente.
+        """
+        if self.status_path is None:
+            return
+
+        tmp_path = f"{self.status_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.status(), file, indent=2)
+        os.replace(tmp_path, self.status_path)
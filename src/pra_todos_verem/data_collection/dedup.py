@@ -0,0 +1,419 @@
+"""
+Índice de hashes perceptuais (dHash) para detectar imagens quase duplicadas entre as coletas.
+
+Examples
+--------
+python -m pra_todos_verem.data_collection.dedup \
+    --root data/raw/ \
+    --max_distance 4 \
+    --output duplicates.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+DESCRIPTION = "Relatório de imagens quase duplicadas do #PraTodosVerem"
+
+# distância de Hamming máxima (em bits, de 64) entre os hashes de duas imagens quase duplicadas
+DEFAULT_MAX_DISTANCE = 4
+
+# extensões das imagens que o PIL consegue abrir (svg não é suportado)
+HASHABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+# quantidade de bits 1 de cada byte
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: compara o brilho de pixels vizinhos de uma miniatura em tons de cinza.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+    hash_size : int
+        O hash tem hash_size * hash_size bits.
+
+    Returns
+    -------
+    int
+    """
+    # em JPEGs, decodifica direto em escala reduzida: só a miniatura importa
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_file(filepath: str) -> Optional[int]:
+    """
+    dHash de um arquivo de imagem.
+
+    Parameters
+    ----------
+    filepath : str
+
+    Returns
+    -------
+    int, optional
+        None se o arquivo não é uma imagem que o PIL consegue abrir (ex: svg).
+    """
+    if not filepath.lower().endswith(HASHABLE_EXTENSIONS):
+        return None
+
+    try:
+        with Image.open(filepath) as image:
+            return dhash(image)
+    except OSError:
+        return None
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """
+    Distância de Hamming entre um hash e um array de hashes, vetorizada.
+
+    Parameters
+    ----------
+    hashes : numpy.ndarray
+        Array uint64.
+    query : int
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    return POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """
+    Índice dos dHashes das imagens coletadas, persistido em um arquivo .npz.
+
+    Os hashes de 64 bits ficam em um array uint64, e a busca calcula a distância de Hamming contra todos
+    eles de uma vez (XOR + contagem de bits por byte), sem laços em Python. As chaves são os caminhos das
+    imagens relativos a root (ex: linkedin/6986131346825859072/0.jpg).
+
+    Os métodos podem ser chamados por várias threads (ex: CrawlPipeline). Ao salvar, o arquivo é lido de novo
+    e recebe apenas as entradas adicionadas e removidas em memória desde o último save: as entradas gravadas
+    por outros processos são mantidas, e as removidas (remove) não voltam ao índice.
+
+    Examples
+    --------
+    index = HashIndex("data/raw/.dhash.npz", root="data/raw/")
+    index.update()
+    print(index.find_duplicates(max_distance=4))
+    """
+
+    def __init__(self, path: str, root: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        path : str
+            Arquivo do índice.
+        root : str, optional
+            Diretório base das chaves. Default: o diretório do arquivo do índice.
+        """
+        self.path = path
+        self.root = root if root is not None else os.path.dirname(path)
+        self.lock = threading.Lock()
+
+        self.keys = []
+        self.key_set = set()
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        # chaves adicionadas e removidas desde o último save
+        self.added = set()
+        self.removed = set()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self._hashes[:len(self.keys)]
+
+    def load(self):
+        """
+        Lê o arquivo do índice, se existir, somando suas entradas às que estão em memória.
+        """
+        keys, hashes = self._read()
+        with self.lock:
+            for key, hash_value in zip(keys, hashes):
+                if key not in self.key_set:
+                    self._append(key, int(hash_value))
+
+    def save(self):
+        """
+        Salva o índice atomicamente: as entradas do arquivo, sem as removidas e com as adicionadas desde
+        o último save. O índice em memória passa a ser o conteúdo salvo.
+        """
+        file_keys, file_hashes = self._read()
+        with self.lock:
+            entries = {
+                key: int(hash_value)
+                for key, hash_value in zip(file_keys, file_hashes)
+                if key not in self.removed
+            }
+            for key, hash_value in zip(self.keys, self.hashes):
+                if key in self.added:
+                    entries[key] = int(hash_value)
+
+            self._reset(list(entries), np.array(list(entries.values()), dtype=np.uint64))
+            self.added = set()
+            self.removed = set()
+            keys = np.array(self.keys, dtype=str)
+            hashes = self.hashes.copy()
+
+        tmp_path = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, keys=keys, hashes=hashes)
+        os.replace(tmp_path, self.path)
+
+    def add(self, key: str, hash_value: int):
+        """
+        Adiciona uma imagem ao índice. Uma chave já indexada é ignorada.
+
+        Parameters
+        ----------
+        key : str
+            Caminho da imagem, relativo a root.
+        hash_value : int
+        """
+        with self.lock:
+            if key not in self.key_set:
+                self._append(key, hash_value)
+                self.added.add(key)
+
+    def add_if_new(self, key: str, hash_value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> bool:
+        """
+        Adiciona uma imagem ao índice, se não existe uma imagem indexada a até max_distance bits do seu hash.
+
+        A busca e a inserção são feitas sob o mesmo lock: duas threads não podem aceitar a mesma imagem.
+
+        Parameters
+        ----------
+        key : str
+            Caminho da imagem, relativo a root.
+        hash_value : int
+        max_distance : int
+
+        Returns
+        -------
+        bool
+            False se a imagem é quase idêntica a uma imagem do índice.
+        """
+        with self.lock:
+            if (hamming_distances(self.hashes, hash_value) <= max_distance).any():
+                return False
+            if key not in self.key_set:
+                self._append(key, hash_value)
+                self.added.add(key)
+            return True
+
+    def remove(self, keys: List[str]):
+        """
+        Remove imagens do índice (ex: as de uma publicação que não chegou a ser salva).
+
+        Parameters
+        ----------
+        keys : list of str
+        """
+        with self.lock:
+            removed = self.key_set.intersection(keys)
+            if not removed:
+                return
+
+            kept = [i for i, key in enumerate(self.keys) if key not in removed]
+            self._reset([self.keys[i] for i in kept], self.hashes[kept])
+            self.added -= removed
+            self.removed |= removed
+
+    def _read(self) -> Tuple[List[str], np.ndarray]:
+        if not os.path.exists(self.path):
+            return [], np.zeros(0, dtype=np.uint64)
+
+        with np.load(self.path) as data:
+            return data["keys"].tolist(), data["hashes"]
+
+    def _reset(self, keys: List[str], hashes: np.ndarray):
+        self.keys = keys
+        self.key_set = set(keys)
+        self._hashes = np.zeros(max(1024, len(keys)), dtype=np.uint64)
+        self._hashes[:len(keys)] = hashes
+
+    def _append(self, key: str, hash_value: int):
+        if len(self.keys) == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[len(self.keys)] = hash_value
+        self.keys.append(key)
+        self.key_set.add(key)
+
+    def query(self, hash_value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Tuple[str, int]]:
+        """
+        Busca as imagens indexadas a até max_distance bits de um hash.
+
+        Parameters
+        ----------
+        hash_value : int
+        max_distance : int
+
+        Returns
+        -------
+        list of tuple
+            (chave, distância), da mais próxima para a mais distante.
+        """
+        with self.lock:
+            hashes = self.hashes
+            distances = hamming_distances(hashes, hash_value)
+            matches = np.flatnonzero(distances <= max_distance)
+            matches = matches[np.argsort(distances[matches], kind="stable")]
+            return [(self.keys[i], int(distances[i])) for i in matches]
+
+    def contains(self, hash_value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> bool:
+        """
+        Se existe uma imagem indexada a até max_distance bits de um hash.
+        """
+        with self.lock:
+            return bool((hamming_distances(self.hashes, hash_value) <= max_distance).any())
+
+    def update(self) -> int:
+        """
+        Indexa as imagens de root/<fonte>/<publicação>/ que ainda não estão no índice.
+
+        Returns
+        -------
+        int
+            Total de imagens adicionadas.
+        """
+        added = 0
+        for source in sorted(os.scandir(self.root), key=lambda entry: entry.name):
+            if not source.is_dir() or source.name.startswith("."):
+                continue
+
+            for post in os.scandir(source.path):
+                if not post.is_dir() or post.name.startswith("."):
+                    continue
+
+                for entry in os.scandir(post.path):
+                    key = os.path.relpath(entry.path, self.root)
+                    if key in self.key_set:
+                        continue
+
+                    hash_value = hash_file(entry.path)
+                    if hash_value is not None:
+                        self.add(key, hash_value)
+                        added += 1
+
+        return added
+
+    def find_duplicates(self, max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Tuple[str, str, int]]:
+        """
+        Todos os pares de imagens indexadas a até max_distance bits uma da outra.
+
+        Evita comparar todos os pares: os 64 bits são divididos em max_distance + 1 blocos e, pelo princípio
+        da casa dos pombos, dois hashes próximos têm ao menos um bloco idêntico. Apenas os hashes que
+        compartilham um bloco são comparados.
+
+        Parameters
+        ----------
+        max_distance : int
+
+        Returns
+        -------
+        list of tuple
+            (chave, chave, distância).
+        """
+        with self.lock:
+            hashes = self.hashes.copy()
+            keys = list(self.keys)
+
+        pairs = set()
+        bounds = np.linspace(0, 64, min(max_distance + 1, 64) + 1).astype(int)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            mask = np.uint64((1 << int(end - start)) - 1)
+            blocks = (hashes >> np.uint64(64 - end)) & mask
+
+            order = np.argsort(blocks, kind="stable")
+            sorted_blocks = blocks[order]
+            # limites dos grupos de hashes com o mesmo bloco
+            boundaries = np.flatnonzero(np.diff(sorted_blocks)) + 1
+            for group in np.split(order, boundaries):
+                if len(group) < 2:
+                    continue
+
+                # compara o grupo todo de uma vez, em fatias de linhas para limitar a memória
+                for row in range(0, len(group), 1024):
+                    rows = group[row:row + 1024]
+                    xor = np.bitwise_xor(hashes[rows][:, None], hashes[group][None, :])
+                    distances = POPCOUNT[xor.view(np.uint8)].reshape(len(rows), len(group), 8).sum(axis=2)
+                    for i, j in zip(*np.nonzero(distances <= max_distance)):
+                        if rows[i] < group[j]:
+                            pairs.add((rows[i], group[j], int(distances[i, j])))
+
+        return [(keys[i], keys[j], distance) for i, j, distance in sorted(pairs)]
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default="data/raw/",
+        help="Diretório dos dados 'raw'",
+    )
+    parser.add_argument(
+        "--index_path",
+        type=str,
+        default=None,
+        help="Arquivo do índice. Default: <root>/.dhash.npz",
+    )
+    parser.add_argument(
+        "--max_distance",
+        type=int,
+        default=DEFAULT_MAX_DISTANCE,
+        help="Distância de Hamming máxima (em bits, de 64) entre imagens quase duplicadas",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Arquivo JSON onde salvar os pares de imagens quase duplicadas",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    index_path = args.index_path if args.index_path is not None else os.path.join(args.root, ".dhash.npz")
+    index = HashIndex(index_path, root=args.root)
+    added = index.update()
+    index.save()
+    print(f"Indexed {added} new images ({len(index)} in total)")
+
+    duplicates = index.find_duplicates(args.max_distance)
+    cross_source = [pair for pair in duplicates if pair[0].split(os.sep)[0] != pair[1].split(os.sep)[0]]
+    duplicated_bytes = sum(os.path.getsize(os.path.join(args.root, key)) for key in {pair[1] for pair in duplicates})
+    print(f"Found {len(duplicates)} near-duplicate pairs ({len(cross_source)} across sources)")
+    print(f"{duplicated_bytes / 1e6:.1f} MB in duplicated images")
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(
+                [{"image": a, "duplicate": b, "distance": distance} for a, b, distance in duplicates],
+                file,
+                indent=2,
+            )
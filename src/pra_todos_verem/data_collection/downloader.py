@@ -0,0 +1,251 @@
+"""
+Download das imagens das publicações, compartilhado pelos crawlers.
+"""
+import hashlib
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pra_todos_verem.data_collection.metrics import Metrics
+from pra_todos_verem.data_collection.rate_limit import (
+    THROTTLE_STATUS,
+    RateLimiter,
+    backoff_delay,
+    parse_retry_after,
+)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 6.3; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/44.0.2403.157 Safari/537.36"
+
+# tamanho dos blocos lidos da resposta e escritos em disco
+CHUNK_SIZE = 64 * 1024
+
+
+class DownloadResult(NamedTuple):
+    """
+    Imagem salva em disco, com o tamanho e o hash calculados durante o download.
+    """
+
+    filepath: str
+    url: str
+    size: int
+    sha256: str
+
+
+class ImageDownloader:
+    """
+    Faz o download das imagens das publicações reaproveitando conexões HTTP.
+
+    Mantém uma única sessão (keep-alive) cujos cookies são copiados do Selenium uma vez por logon,
+    e um pool limitado de threads para baixar as imagens de uma publicação em paralelo.
+    Cada requisição aguarda o RateLimiter do host, que se adapta às respostas do servidor.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        metrics: Optional[Metrics] = None,
+        timeout: Tuple[float, float] = (10, 30),
+        max_retries: int = 3,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        self.max_workers = max_workers
+        # (conexão, leitura) em segundos. a leitura é o tempo máximo sem receber nenhum byte
+        self.timeout = timeout
+        # tentativas de retomar um download interrompido, a partir do último byte recebido
+        self.max_retries = max_retries
+        # compartilhado com a navegação do crawler
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+
+        # um pool de conexões por host, com tamanho suficiente para todas as threads
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cookies_synced = False
+
+    def sync_cookies(self, browser):
+        """
+        Copia os cookies do Selenium para a sessão HTTP.
+
+        Deve ser chamado após o logon, para não precisar passar pelo login nos downloads.
+
+        Parameters
+        ----------
+        browser : selenium.webdriver.Firefox
+        """
+        self.session.cookies.clear()
+        for cookie in browser.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"])
+        self.cookies_synced = True
+
+    def download_image(self, image_url: Optional[str], image_filepath: str) -> Optional[DownloadResult]:
+        """
+        Faz o download de uma imagem a partir de uma URL.
+
+        A resposta é lida em blocos e escrita em um arquivo temporário (<arquivo>.part), enquanto o tamanho
+        e o sha256 são calculados. Ao final, o arquivo é sincronizado em disco (fsync) e renomeado: um arquivo
+        com o nome final está sempre completo. Uma conexão interrompida é retomada com um header Range.
+
+        A extensão do arquivo é definida a partir do content-type da resposta.
+
+        Parameters
+        ----------
+        image_url : str, optional
+        image_filepath : str
+            Caminho do arquivo, sem a extensão.
+
+        Returns
+        -------
+        DownloadResult, optional
+            None se a URL não foi definida ou o download falhou.
+        """
+        # algumas vezes o elemento img não tem src definido. apenas retornamos neste caso
+        if not isinstance(image_url, str):
+            return None
+
+        part_filepath = f"{image_filepath}.part"
+        with self.metrics.timer("download_image", url=image_url) as fields:
+            try:
+                extension, size, sha256 = self.stream_to_file(image_url, part_filepath, fields)
+            except (requests.RequestException, OSError) as e:
+                print(e)
+                print(f"Failed to download {image_url}! Continue to next...")
+                if os.path.exists(part_filepath):
+                    os.remove(part_filepath)
+                return None
+            fields["bytes"] = size
+
+        image_filepath = f"{image_filepath}{extension}"
+        os.replace(part_filepath, image_filepath)
+
+        return DownloadResult(image_filepath, image_url, size, sha256)
+
+    def stream_to_file(self, image_url: str, filepath: str, fields: dict) -> Tuple[str, int, str]:
+        """
+        Escreve a resposta de uma URL em um arquivo, bloco a bloco, retomando conexões interrompidas.
+
+        Conexões interrompidas, timeouts e respostas 429/5xx são tentados novamente após um backoff exponencial.
+
+        Parameters
+        ----------
+        image_url : str
+        filepath : str
+        fields : dict
+            Campos da métrica do download (status).
+
+        Returns
+        -------
+        tuple
+            (extensão, tamanho em bytes, sha256)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        extension = None
+
+        with open(filepath, "wb") as file:
+            for attempt in range(1, self.max_retries + 2):
+                headers = {"Range": f"bytes={size}-"} if size > 0 else {}
+                try:
+                    with self.rate_limiter.limit(image_url) as request, self.session.get(
+                        image_url, headers=headers, stream=True, timeout=self.timeout, allow_redirects=True
+                    ) as r:
+                        request["status"] = r.status_code
+                        request["retry_after"] = parse_retry_after(r.headers.get("retry-after"))
+                        # tempo até os headers: o corpo de uma imagem grande é naturalmente mais lento
+                        request["latency"] = r.elapsed.total_seconds()
+                        fields["status"] = r.status_code
+                        r.raise_for_status()
+
+                        if size > 0 and r.status_code != 206:
+                            # o servidor não aceitou o Range: recomeça do início
+                            file.seek(0)
+                            file.truncate()
+                            digest = hashlib.sha256()
+                            size = 0
+
+                        if extension is None:
+                            extension = self.guess_extension(image_url, r.headers.get("content-type", ""))
+
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            file.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                    break
+                except (
+                    requests.ConnectionError,
+                    requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.HTTPError,
+                ) as e:
+                    retryable = not isinstance(e, requests.HTTPError) or e.response.status_code in THROTTLE_STATUS
+                    if not retryable or attempt > self.max_retries:
+                        raise
+                    print(e)
+                    print(f"Retrying {image_url} from byte {size}... Attempt {attempt} of {self.max_retries}")
+                    with self.metrics.timer("backoff"):
+                        sleep(backoff_delay(attempt))
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        return extension, size, digest.hexdigest()
+
+    def guess_extension(self, image_url: str, content_type: str) -> str:
+        """
+        Extensão do arquivo a partir do content-type ou, se desconhecido, da URL.
+
+        Parameters
+        ----------
+        image_url : str
+        content_type : str
+
+        Returns
+        -------
+        str
+        """
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if extension is None:
+            extension = os.path.splitext(urlparse(image_url).path)[1]
+        return extension
+
+    def download_images(
+        self, image_urls: Iterable[Optional[str]], data_path: str
+    ) -> List[Optional[DownloadResult]]:
+        """
+        Faz o download, em paralelo, das imagens de uma publicação.
+
+        As imagens são salvas como <data_path>/<index>.<extensão>, na ordem em que aparecem.
+
+        Parameters
+        ----------
+        image_urls : iterable of str
+        data_path : str
+
+        Returns
+        -------
+        list
+            DownloadResult das imagens salvas (None se falhou), na mesma ordem das URLs.
+        """
+        futures = [
+            self.executor.submit(self.download_image, image_url, os.path.join(data_path, f"{index}"))
+            for index, image_url in enumerate(image_urls)
+        ]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+        Aguarda os downloads pendentes e fecha as conexões.
+        """
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,287 @@
+"""
+Servidor HTTP local que imita as páginas do LinkedIn e do Instagram usadas pelos crawlers.
+
+Serve telas de logon, feeds de hashtag e imagens geradas, com a mesma estrutura de elementos
+que as XPaths dos crawlers esperam. Permite rodar os crawlers (e medir o seu desempenho) sem rede
+e sem contas reais.
+"""
+import html
+import io
+import json
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+# publicações por página do feed do LinkedIn. as próximas páginas são carregadas ao rolar a tela
+POSTS_PER_PAGE = 10
+
+LINKEDIN_LOGON_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+<form method="get" action="{redirect}">
+    <input id="username" type="text">
+    <input id="password" type="password">
+    <button type="submit">Sign in</button>
+</form>
+</body>
+</html>
+"""
+
+LINKEDIN_FEED_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+<div id="feed">
+{posts}
+</div>
+<script>
+var page = 1;
+var loading = false;
+window.addEventListener("scroll", function () {{
+    if (loading || window.innerHeight + window.scrollY < document.body.scrollHeight - 400) {{
+        return;
+    }}
+    loading = true;
+    fetch("?page=" + page).then(function (response) {{
+        return response.text();
+    }}).then(function (posts) {{
+        document.getElementById("feed").insertAdjacentHTML("beforeend", posts);
+        page++;
+        loading = false;
+    }});
+}});
+</script>
+</body>
+</html>
+"""
+
+LINKEDIN_POST = """<div>
+    <div data-id="urn:li:activity:{post_id}" style="min-height: 600px">
+        <span class="feed-shared-actor__title">{author}<br>Seguidores</span>
+        <div class="feed-shared-update-v2__description-wrapper">{caption}</div>
+        <span class="feed-shared-inline-show-more-text__see-more-text" onclick="this.style.display='none'">…see more</span>
+        {images}
+    </div>
+</div>
+"""
+
+INSTAGRAM_LOGON_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+<form method="get" action="{redirect}">
+    <input name="username" type="text">
+    <input name="password" type="password">
+    <button type="submit"><div>Log In</div></button>
+</form>
+</body>
+</html>
+"""
+
+INSTAGRAM_TAG_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+<article id="grid" style="min-height: 300px">{thumbnails}</article>
+<div id="scrollview" tabindex="0" style="display: none">
+    <article role="presentation"></article>
+</div>
+<script>
+var posts = {posts};
+var current = 0;
+
+function escape(text) {{
+    var div = document.createElement("div");
+    div.innerText = text;
+    return div.innerHTML;
+}}
+
+function render() {{
+    var post = posts[current];
+    document.querySelector("article[role='presentation']").innerHTML =
+        post.images.map(function (src) {{ return "<img src='" + src + "'>"; }}).join("") +
+        "<div><h2><a href='#'>" + escape(post.author) + "</a></h2>" +
+        "<div><span>" + escape(post.caption) + "</span></div></div>" +
+        "<time datetime='" + post.datetime + "'></time>";
+}}
+
+document.getElementById("grid").addEventListener("click", function () {{
+    current = 0;
+    render();
+    var scrollview = document.getElementById("scrollview");
+    scrollview.style.display = "block";
+    scrollview.focus();
+}});
+
+document.getElementById("scrollview").addEventListener("keydown", function (event) {{
+    if (event.key === "ArrowRight" && current < posts.length - 1) {{
+        current++;
+        render();
+    }}
+}});
+</script>
+</body>
+</html>
+"""
+
+
+class FakeSocialNetwork:
+    """
+    Publicações geradas de forma determinística para o servidor local.
+
+    Parameters
+    ----------
+    num_posts : int
+        Total de publicações de cada website.
+    max_images_per_post : int
+        Cada publicação tem entre 1 e max_images_per_post imagens (carrossel).
+    image_size : int
+        Largura e altura das imagens geradas, em pixels.
+    seed : int
+    """
+
+    def __init__(
+        self,
+        num_posts: int = 100,
+        max_images_per_post: int = 4,
+        image_size: int = 512,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        first_datetime = datetime(2022, 10, 1, 12, 0)
+
+        self.posts = []
+        for index in range(num_posts):
+            self.posts.append(
+                {
+                    "post_id": str(6900000000000000000 + index),
+                    "datetime": (first_datetime - timedelta(minutes=index)).isoformat() + ".000Z",
+                    "author": f"Autor {rng.randint(1, num_posts // 4 + 1)}",
+                    "caption": f"#PraTodosVerem #PraCegoVer Descrição da imagem da publicação {index}.",
+                    "images": [
+                        f"/media/{index}_{image_index}.jpg"
+                        for image_index in range(rng.randint(1, max_images_per_post))
+                    ],
+                }
+            )
+
+        self.image_size = image_size
+        self.images = {}
+        self.lock = threading.Lock()
+
+    def image(self, name: str) -> bytes:
+        """
+        JPEG (ruído aleatório, para não ser comprimido demais) de uma imagem das publicações.
+
+        As imagens são geradas na primeira requisição e mantidas em memória.
+        """
+        with self.lock:
+            if name not in self.images:
+                image = Image.effect_noise((self.image_size, self.image_size), 64).convert("RGB")
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=90)
+                self.images[name] = buffer.getvalue()
+            return self.images[name]
+
+    def linkedin_posts(self, page: int) -> str:
+        posts = self.posts[page * POSTS_PER_PAGE:(page + 1) * POSTS_PER_PAGE]
+        return "".join(
+            LINKEDIN_POST.format(
+                post_id=post["post_id"],
+                author=html.escape(post["author"]),
+                caption=html.escape(post["caption"]),
+                images="".join(f'<img src="{src}">' for src in post["images"]),
+            )
+            for post in posts
+        )
+
+    def instagram_posts(self) -> List[Dict]:
+        return [
+            {key: post[key] for key in ("datetime", "author", "caption", "images")}
+            for post in self.posts
+        ]
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Responde as requisições com as páginas e imagens da FakeSocialNetwork do servidor.
+    """
+
+    def do_GET(self):
+        network = self.server.network
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path.startswith("/media/"):
+            self.respond(network.image(url.path), "image/jpeg")
+        elif url.path.startswith("/uas/login"):
+            redirect = html.escape(params.get("session_redirect", ["/"])[0])
+            self.respond(LINKEDIN_LOGON_PAGE.format(redirect=redirect))
+        elif url.path.startswith("/feed/hashtag/"):
+            if "page" in params:
+                self.respond(network.linkedin_posts(int(params["page"][0])))
+            else:
+                self.respond(LINKEDIN_FEED_PAGE.format(posts=network.linkedin_posts(0)))
+        elif url.path.startswith("/accounts/login/"):
+            redirect = html.escape(params.get("next", ["/"])[0])
+            self.respond(INSTAGRAM_LOGON_PAGE.format(redirect=redirect))
+        elif url.path.startswith("/explore/tags/"):
+            posts = network.instagram_posts()
+            thumbnails = "".join(f'<img src="{post["images"][0]}">' for post in posts[:9])
+            self.respond(INSTAGRAM_TAG_PAGE.format(thumbnails=thumbnails, posts=json.dumps(posts)))
+        elif url.path == "/":
+            self.respond("<!DOCTYPE html><html><body></body></html>")
+        else:
+            self.send_error(404)
+
+    def respond(self, body, content_type: str = "text/html; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=fake; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeServer:
+    """
+    Servidor HTTP local, em uma thread, que imita o LinkedIn e o Instagram.
+
+    Examples
+    --------
+    with FakeServer(FakeSocialNetwork(num_posts=50)) as server:
+        LinkedInCrawler(query="PraTodosVerem", save_path="/tmp/raw", base_url=server.url).run()
+    """
+
+    def __init__(self, network: FakeSocialNetwork, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), FakeRequestHandler)
+        self.server.daemon_threads = True
+        self.server.network = network
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,11 +1,8 @@
-import mimetypes
 import os
 from time import sleep
 from typing import Generator, Optional
 
 import dateutil.parser
-import requests
-from selenium import webdriver
 from selenium.common.exceptions import (
     ElementNotInteractableException,
     NoSuchElementException,
@@ -13,11 +10,48 @@ from selenium.common.exceptions import (
 )
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import quote_plus
 
+from pra_todos_verem.data_collection.browser import create_browser
+from pra_todos_verem.data_collection.catalog import Catalog
+from pra_todos_verem.data_collection.checkpoint import Checkpoint
+from pra_todos_verem.data_collection.dedup import HashIndex
+from pra_todos_verem.data_collection.downloader import ImageDownloader
+from pra_todos_verem.data_collection.metrics import Metrics
+from pra_todos_verem.data_collection.pipeline import CrawlPipeline, PostRecord, write_post
+from pra_todos_verem.data_collection.rate_limit import RateLimiter, backoff_delay
+from pra_todos_verem.data_collection.session import BrowserSession
+
+# extrai os dados da publicação aberta em uma única chamada ao WebDriver.
+# usa as mesmas XPaths dos métodos find_post_*. retorna null enquanto a publicação não foi carregada.
+EXTRACT_POST_SCRIPT = """
+function evaluate(xpath) {
+    var result = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) {
+        nodes.push(result.snapshotItem(i));
+    }
+    return nodes;
+}
+
+var time = evaluate("//article[@role='presentation']//time")[0];
+if (!time) {
+    return null;
+}
+var caption = evaluate("//article[@role='presentation']//h2/following-sibling::div/span")[0];
+var author = evaluate("//article[@role='presentation']//h2//a")[0];
+return {
+    datetime: time.getAttribute("datetime"),
+    image_urls: evaluate("//article[@role='presentation']//img").map(function (element) {
+        return element.hasAttribute("src") ? element.src : null;
+    }),
+    caption: caption ? caption.innerText : "",
+    author: author ? author.innerText : "",
+};
+"""
+
 
 class InstagramCrawler:
     """
@@ -34,34 +68,167 @@ class InstagramCrawler:
         save_path: str,
         headless: bool = False,
         max_downloads: int = 10,
+        download_threads: int = 4,
+        pipeline_workers: int = 0,
+        batch_extraction: bool = False,
+        stop_after_known: int = 5,
+        lean: bool = False,
+        session_path: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        dedup: bool = False,
+        base_url: str = "https://www.instagram.com",
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.save_path = os.path.join(save_path, "instagram")
-        self.search_url = f"https://www.instagram.com/explore/tags/{query.lower()}/"
-        self.logon_url = f"https://www.instagram.com/accounts/login/?next={quote_plus(self.search_url)}"
+        # base_url permite apontar o crawler para um servidor local (ex: benchmarks)
+        self.base_url = base_url
+        self.search_url = f"{base_url}/explore/tags/{query.lower()}/"
+        self.logon_url = f"{base_url}/accounts/login/?next={quote_plus(self.search_url)}"
         self.username = os.environ["INSTAGRAM_USERNAME"]
         self.password = os.environ["INSTAGRAM_PASSWORD"]
         self.max_downloads = max_downloads
+        # pipeline_workers > 0 faz o download e a escrita em disco em segundo plano, sem bloquear a navegação
+        self.pipeline_workers = pipeline_workers
+        # batch_extraction=True extrai os dados de cada publicação com um único execute_script
+        self.batch_extraction = batch_extraction
+        # publicações já coletadas são ignoradas. a coleta para após stop_after_known delas em sequência
+        self.checkpoint = Checkpoint(
+            os.path.join(self.save_path, f".checkpoint-{query.lower()}.json"), self.save_path
+        )
+        self.stop_after_known = stop_after_known
+        self.pipeline = None
 
         # headless=True permite rodar a automação em um processo de CI, sem um display
-        options = Options()
-        options.headless = headless
-        self.browser = webdriver.Firefox(options=options)
+        # lean=True não carrega imagens, vídeos e fontes, que são baixados novamente pelo downloader
+        # session_path permite reaproveitar o perfil do Firefox e os cookies de uma execução anterior
+        self.session = (
+            BrowserSession(os.path.join(session_path, "instagram"), query)
+            if session_path is not None
+            else None
+        )
+        self.browser = create_browser(
+            headless=headless,
+            lean=lean,
+            profile_path=self.session.profile_path if self.session is not None else None,
+        )
+
+        # metrics_path registra a duração de cada fase da coleta em um arquivo JSONL
+        self.metrics = Metrics(metrics_path, website="instagram", query=query.lower())
+        # limites de requisições por host, compartilhados pela navegação e pelos downloads
+        # rate_limiter permite desligar os limites (ex: benchmarks contra um servidor local)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.downloader = ImageDownloader(
+            max_workers=download_threads, metrics=self.metrics, rate_limiter=self.rate_limiter
+        )
+
+        # dedup=True descarta imagens quase idênticas a imagens já coletadas, em qualquer website
+        self.dedup_index = (
+            HashIndex(os.path.join(save_path, ".dhash.npz"), root=save_path) if dedup else None
+        )
+        # catálogo SQLite das publicações salvas, compartilhado por todos os websites
+        self.catalog = Catalog(os.path.join(save_path, ".catalog.sqlite"), root=save_path)
 
     def run(self):
         """
         Orquestra o webcrawler realizando navegação e download dos dados de interesse.
+
+        Um erro (ex: sessão expirada) encerra apenas esta coleta: o checkpoint, o índice de hashes e as métricas
+        são salvos e o navegador é fechado mesmo assim.
+        """
+        try:
+            self.start()
+            self.collect()
+        except Exception as e:
+            print(e)
+            print(f"Crawl of #{self.metrics.tags['query']} failed. Saving the posts collected so far...")
+        finally:
+            self.finalize()
+
+    def start(self):
+        """
+        Deixa o navegador autenticado na página da hashtag: reaproveita a sessão salva ou faz o logon.
         """
-        self.launch()
-        self.logon()
+        with self.metrics.timer("logon"):
+            if not self.restore_session():
+                self.launch()
+                self.logon()
 
-        for index in range(0, self.max_downloads):
-            try:
-                self.goto_result(index)
-                self.download_data()
-            except NoSuchElementException:
-                print("Unexpected error! Continue to next...")
+    def collect(self):
+        """
+        Uma passada pelas publicações da hashtag aberta, salvando as que ainda não foram coletadas.
+        """
+        self.checkpoint.start()
+        with CrawlPipeline(self.save_post, num_workers=self.pipeline_workers) as pipeline:
+            # permite acompanhar o tamanho da fila (ex: daemon.py)
+            self.pipeline = pipeline
+            for index in range(0, self.max_downloads):
+                try:
+                    with self.metrics.timer("goto_result"):
+                        self.goto_result(index)
+                    record = self.extract_post()
+
+                    if self.checkpoint.visit(record.post_id):
+                        pipeline.put(record)
+                        continue
+
+                    # publicação já coletada: não faz o download
+                    print(f"Skipping post {record.post_id}, already collected")
+
+                    if self.checkpoint.should_stop(self.stop_after_known):
+                        print("Reached posts already collected. Stopping...")
+                        break
+                except NoSuchElementException:
+                    print("Unexpected error! Continue to next...")
+        self.pipeline = None
+        self.checkpoint.finish()
+
+        if self.session is not None:
+            self.session.save_cookies(self.browser)
+
+    def set_query(self, query: str):
+        """
+        Troca a query da coleta e abre a página da hashtag, sem um novo logon.
+
+        Parameters
+        ----------
+        query : str
+        """
+        self.search_url = f"{self.base_url}/explore/tags/{query.lower()}/"
+        self.logon_url = f"{self.base_url}/accounts/login/?next={quote_plus(self.search_url)}"
+        self.checkpoint = Checkpoint(
+            os.path.join(self.save_path, f".checkpoint-{query.lower()}.json"), self.save_path
+        )
+        self.metrics.tags["query"] = query.lower()
+        self.browser.get(self.search_url)
+
+    def restore_session(self) -> bool:
+        """
+        Reaproveita a sessão salva e verifica se ela ainda é válida.
+
+        Returns
+        -------
+        bool
+            False se a sessão não existe ou expirou, e é necessário fazer o logon.
+        """
+        if self.session is None:
+            return False
+
+        # os cookies só podem ser adicionados a partir de uma página do seu domínio
+        self.browser.get(f"{self.base_url}/")
+        self.session.load_cookies(self.browser)
+        self.browser.get(self.search_url)
+
+        max_wait_in_seconds = 10
+        try:
+            WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+                EC.presence_of_element_located((By.XPATH, "//article"))
+            )
+        except TimeoutException:
+            print("Saved session is not valid. Logging in...")
+            return False
 
-        self.finalize()
+        print("Reusing saved session")
+        return True
 
     def launch(self):
         """
@@ -102,24 +269,26 @@ class InstagramCrawler:
         max_wait_in_seconds = 30
         for attempt in range(1, max_attempts + 1):
             try:
-                if index == 0:
-                    link_element = WebDriverWait(
-                        self.browser, timeout=max_wait_in_seconds
-                    ).until(EC.element_to_be_clickable((By.XPATH, "//article[last()]")))
-
-                    if link_element.is_displayed():
-                        link_element.click()
-
-                else:
-                    overlay_element = WebDriverWait(
-                        self.browser, timeout=max_wait_in_seconds
-                    ).until(
-                        EC.element_to_be_clickable(
-                            (By.XPATH, "//div[@id='scrollview']")
+                # só espaça a navegação: esperas do DOM não são respostas HTTP e não ajustam os limites
+                with self.rate_limiter.limit(self.base_url, adjust=False):
+                    if index == 0:
+                        link_element = WebDriverWait(
+                            self.browser, timeout=max_wait_in_seconds
+                        ).until(EC.element_to_be_clickable((By.XPATH, "//article[last()]")))
+
+                        if link_element.is_displayed():
+                            link_element.click()
+
+                    else:
+                        overlay_element = WebDriverWait(
+                            self.browser, timeout=max_wait_in_seconds
+                        ).until(
+                            EC.element_to_be_clickable(
+                                (By.XPATH, "//div[@id='scrollview']")
+                            )
                         )
-                    )
-                    if overlay_element.is_displayed():
-                        overlay_element.send_keys(Keys.ARROW_RIGHT)
+                        if overlay_element.is_displayed():
+                            overlay_element.send_keys(Keys.ARROW_RIGHT)
             except (ElementNotInteractableException, TimeoutException) as e:
                 # BUG
                 # o wait pode acessar elementos invisíveis. neste caso, ocorre uma ElementNotInteractableException.
@@ -128,7 +297,11 @@ class InstagramCrawler:
                 print(
                     f"Trying again in a few seconds... Attempt {attempt} of {max_attempts}"
                 )
-                sleep(2)
+                self.metrics.increment("retries")
+                if isinstance(e, TimeoutException):
+                    self.metrics.increment("timeouts")
+                with self.metrics.timer("backoff"):
+                    sleep(backoff_delay(attempt))
             else:
                 print(f"Visiting post {index + 1} of {self.max_downloads}")
                 break
@@ -137,31 +310,79 @@ class InstagramCrawler:
         """
         Faz o download dos dados de interesse da publicação: imagem, texto, autor e data de publicação.
         """
-        post_datetime_str = self.find_post_datetime()
+        self.save_post(self.extract_post())
+
+    def extract_post(self) -> PostRecord:
+        """
+        Extrai os dados da publicação aberta, sem fazer downloads.
+
+        Returns
+        -------
+        PostRecord
+        """
+        # os cookies são copiados uma única vez, após o logon ter sido concluído
+        if not self.downloader.cookies_synced:
+            self.downloader.sync_cookies(self.browser)
+
+        if self.batch_extraction:
+            return self.extract_post_at_once()
+
+        with self.metrics.timer("find_post_datetime"):
+            post_id = self.find_post_datetime()
+        with self.metrics.timer("find_post_image_urls"):
+            image_urls = list(self.find_post_image_urls())
+        with self.metrics.timer("find_post_caption"):
+            caption = self.find_post_caption()
+        with self.metrics.timer("find_post_author"):
+            author = self.find_post_author()
+
+        return PostRecord(
+            post_id=post_id,
+            image_urls=image_urls,
+            caption=caption,
+            author=author,
+        )
 
-        # cria uma pasta para os dados da publicação
-        data_path = os.path.join(self.save_path, post_datetime_str)
-        os.makedirs(data_path, exist_ok=True)
+    def extract_post_at_once(self) -> PostRecord:
+        """
+        Extrai os dados da publicação aberta com uma única chamada execute_script.
 
-        image_urls = self.find_post_image_urls()
+        Returns
+        -------
+        PostRecord
+        """
+        max_wait_in_seconds = 30
+        with self.metrics.timer("extract_post_at_once"):
+            post = WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+                lambda browser: browser.execute_script(EXTRACT_POST_SCRIPT)
+            )
 
-        for index, image_url in enumerate(image_urls):
-            image_filename = f"{index}"
-            image_filepath = os.path.join(data_path, image_filename)
+        post_datetime = dateutil.parser.parse(post["datetime"])
+        return PostRecord(
+            post_id=post_datetime.strftime("%Y%m%d%H%M"),
+            image_urls=post["image_urls"],
+            caption=post["caption"],
+            author=post["author"],
+        )
 
-            self.download_image(image_url, image_filepath)
+    def save_post(self, record: PostRecord):
+        """
+        Faz o download das imagens e salva o texto e o autor de uma publicação.
 
-        caption = self.find_post_caption()
-        caption_filename = "caption.txt"
-        caption_filepath = os.path.join(data_path, caption_filename)
-        with open(caption_filepath, "w") as file:
-            file.write(caption)
+        Parameters
+        ----------
+        record : PostRecord
+        """
+        with self.metrics.timer("save_post", post_id=record.post_id):
+            saved = write_post(
+                record, self.save_path, self.downloader, self.metrics, self.dedup_index, self.catalog
+            )
 
-        author = self.find_post_author()
-        author_filename = "author.txt"
-        author_filepath = os.path.join(data_path, author_filename)
-        with open(author_filepath, "w") as file:
-            file.write(author)
+        if saved:
+            self.metrics.increment("posts")
+        else:
+            print(f"Post {record.post_id} was already saved or has no new images. Discarding...")
+        self.checkpoint.add(record.post_id)
 
     def find_post_datetime(self) -> str:
         """
@@ -200,39 +421,6 @@ class InstagramCrawler:
             image_url = element.get_attribute("src")
             yield image_url
 
-    def download_image(self, image_url: Optional[str], image_filepath: str):
-        """
-        Faz o download de uma imagem a partir de uma URL.
-
-        Utiliza os cookies do Selenium para não precisar passar pelo login.
-
-        Parameters
-        ----------
-        image_url : str, optional
-        image_filepath : str
-        """
-        # algumas vezes o elemento img tem src definido. apenas retornamos neste caso
-        if not isinstance(image_url, str):
-            return
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 6.3; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/44.0.2403.157 Safari/537.36"
-        }
-        s = requests.session()
-        s.headers.update(headers)
-
-        for cookie in self.browser.get_cookies():
-            c = {cookie["name"]: cookie["value"]}
-            s.cookies.update(c)
-
-        r = s.get(image_url, allow_redirects=True)
-        extension = mimetypes.guess_extension(
-            r.headers.get("content-type", "").split(";")[0]
-        )
-        image_filepath = f"{image_filepath}{extension}"
-        with open(image_filepath, "wb") as file:
-            file.write(r.content)
-
     def find_post_caption(self) -> str:
         """
         Extrai a descrição da publicação.
@@ -270,6 +458,15 @@ class InstagramCrawler:
 
     def finalize(self):
         """
-        Fecha o navegador.
+        Salva o checkpoint, fecha o navegador e as conexões do download de imagens, e imprime o resumo da coleta.
+        O navegador é fechado mesmo se um dos passos anteriores falhar.
         """
-        self.browser.quit()
+        try:
+            self.checkpoint.flush()
+            self.downloader.close()
+            if self.dedup_index is not None:
+                self.dedup_index.save()
+            self.catalog.close()
+            self.metrics.close()
+        finally:
+            self.browser.quit()
@@ -1,10 +1,7 @@
-import mimetypes
 import os
 from time import sleep
-from typing import Generator, Optional
+from typing import Generator, List, Optional
 
-import requests
-from selenium import webdriver
 from selenium.common.exceptions import (
     ElementNotInteractableException,
     NoSuchElementException,
@@ -12,11 +9,50 @@ from selenium.common.exceptions import (
 )
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import quote_plus
 
+from pra_todos_verem.data_collection.browser import create_browser
+from pra_todos_verem.data_collection.catalog import Catalog
+from pra_todos_verem.data_collection.checkpoint import Checkpoint
+from pra_todos_verem.data_collection.dedup import HashIndex
+from pra_todos_verem.data_collection.downloader import ImageDownloader
+from pra_todos_verem.data_collection.metrics import Metrics
+from pra_todos_verem.data_collection.pipeline import CrawlPipeline, PostRecord, write_post
+from pra_todos_verem.data_collection.rate_limit import RateLimiter, backoff_delay
+from pra_todos_verem.data_collection.session import BrowserSession
+
+# extrai os dados de todas as publicações visíveis no feed em uma única chamada ao WebDriver.
+# usa as mesmas XPaths dos métodos find_post_*, relativas ao div de cada publicação.
+EXTRACT_POSTS_SCRIPT = """
+function evaluate(xpath, context) {
+    var result = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) {
+        nodes.push(result.snapshotItem(i));
+    }
+    return nodes;
+}
+
+return evaluate("//div[starts-with(@data-id,'urn:li:activity')]", document).map(function (post) {
+    evaluate(".//span[contains(@class,'feed-shared-inline-show-more-text__see-more-text')]", post).forEach(function (span) {
+        span.click();
+    });
+    var caption = evaluate(".//div[@class='feed-shared-update-v2__description-wrapper']", post)[0];
+    var author = evaluate(".//span[@class='feed-shared-actor__title']", post)[0];
+    return {
+        data_id: post.getAttribute("data-id"),
+        image_urls: evaluate(".//*[self::img or self::video]", post).map(function (element) {
+            var attribute = element.tagName.toLowerCase() === "img" ? "src" : "poster";
+            return element.hasAttribute(attribute) ? element[attribute] : null;
+        }),
+        caption: caption ? caption.innerText : "",
+        author: author ? author.innerText.split("\\n")[0] : "",
+    };
+});
+"""
+
 
 class LinkedInCrawler:
     """
@@ -33,35 +69,237 @@ class LinkedInCrawler:
         save_path: str,
         headless: bool = False,
         max_downloads: int = 10,
+        download_threads: int = 4,
+        pipeline_workers: int = 0,
+        batch_extraction: bool = False,
+        stop_after_known: int = 5,
+        lean: bool = False,
+        session_path: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        dedup: bool = False,
+        base_url: str = "https://www.linkedin.com",
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.save_path = os.path.join(save_path, "linkedin")
-        self.search_url = f"https://www.linkedin.com/feed/hashtag/{query.lower()}/"
-        self.logon_url = f"https://www.linkedin.com/uas/login?session_redirect={quote_plus(self.search_url)}&trk=login_reg_redirect"
+        # base_url permite apontar o crawler para um servidor local (ex: benchmarks)
+        self.base_url = base_url
+        self.search_url = f"{base_url}/feed/hashtag/{query.lower()}/"
+        self.logon_url = f"{base_url}/uas/login?session_redirect={quote_plus(self.search_url)}&trk=login_reg_redirect"
         self.username = os.environ["LINKEDIN_USERNAME"]
         self.password = os.environ["LINKEDIN_PASSWORD"]
         self.max_downloads = max_downloads
+        # pipeline_workers > 0 faz o download e a escrita em disco em segundo plano, sem bloquear a navegação
+        self.pipeline_workers = pipeline_workers
+        # batch_extraction=True extrai todas as publicações visíveis com um único execute_script
+        self.batch_extraction = batch_extraction
+        # publicações já coletadas são ignoradas. a coleta para após stop_after_known delas em sequência
+        self.checkpoint = Checkpoint(
+            os.path.join(self.save_path, f".checkpoint-{query.lower()}.json"), self.save_path
+        )
+        self.stop_after_known = stop_after_known
+        self.pipeline = None
 
         # headless=True permite rodar a automação em um processo de CI, sem um display
-        options = Options()
-        options.headless = headless
-        self.browser = webdriver.Firefox(options=options)
+        # lean=True não carrega imagens, vídeos e fontes, que são baixados novamente pelo downloader
+        # session_path permite reaproveitar o perfil do Firefox e os cookies de uma execução anterior
+        self.session = (
+            BrowserSession(os.path.join(session_path, "linkedin"), query)
+            if session_path is not None
+            else None
+        )
+        self.browser = create_browser(
+            headless=headless,
+            lean=lean,
+            profile_path=self.session.profile_path if self.session is not None else None,
+        )
+
+        # metrics_path registra a duração de cada fase da coleta em um arquivo JSONL
+        self.metrics = Metrics(metrics_path, website="linkedin", query=query.lower())
+        # limites de requisições por host, compartilhados pela navegação e pelos downloads
+        # rate_limiter permite desligar os limites (ex: benchmarks contra um servidor local)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.downloader = ImageDownloader(
+            max_workers=download_threads, metrics=self.metrics, rate_limiter=self.rate_limiter
+        )
+
+        # dedup=True descarta imagens quase idênticas a imagens já coletadas, em qualquer website
+        self.dedup_index = (
+            HashIndex(os.path.join(save_path, ".dhash.npz"), root=save_path) if dedup else None
+        )
+        # catálogo SQLite das publicações salvas, compartilhado por todos os websites
+        self.catalog = Catalog(os.path.join(save_path, ".catalog.sqlite"), root=save_path)
 
     def run(self):
         """
         Orquestra o webcrawler realizando navegação e download dos dados de interesse.
+
+        Um erro (ex: sessão expirada) encerra apenas esta coleta: o checkpoint, o índice de hashes e as métricas
+        são salvos e o navegador é fechado mesmo assim.
+        """
+        try:
+            self.start()
+            self.collect()
+        except Exception as e:
+            print(e)
+            print(f"Crawl of #{self.metrics.tags['query']} failed. Saving the posts collected so far...")
+        finally:
+            self.finalize()
+
+    def start(self):
+        """
+        Deixa o navegador autenticado na página da hashtag: reaproveita a sessão salva ou faz o logon.
+        """
+        with self.metrics.timer("logon"):
+            if not self.restore_session():
+                self.launch()
+                self.logon()
+
+    def collect(self):
+        """
+        Uma passada pelo feed da hashtag aberta, salvando as publicações que ainda não foram coletadas.
+        """
+        self.checkpoint.start()
+        with CrawlPipeline(self.save_post, num_workers=self.pipeline_workers) as pipeline:
+            # permite acompanhar o tamanho da fila (ex: daemon.py)
+            self.pipeline = pipeline
+            if self.batch_extraction:
+                self.crawl_batches(pipeline)
+            else:
+                self.crawl(pipeline)
+        self.pipeline = None
+        self.checkpoint.finish()
+
+        if self.session is not None:
+            self.session.save_cookies(self.browser)
+
+    def set_query(self, query: str):
+        """
+        Troca a query da coleta e abre a página da hashtag, sem um novo logon.
+
+        Parameters
+        ----------
+        query : str
         """
-        self.launch()
-        self.logon()
+        self.search_url = f"{self.base_url}/feed/hashtag/{query.lower()}/"
+        self.logon_url = (
+            f"{self.base_url}/uas/login?session_redirect={quote_plus(self.search_url)}&trk=login_reg_redirect"
+        )
+        self.checkpoint = Checkpoint(
+            os.path.join(self.save_path, f".checkpoint-{query.lower()}.json"), self.save_path
+        )
+        self.metrics.tags["query"] = query.lower()
+        self.browser.get(self.search_url)
 
+    def crawl(self, pipeline: CrawlPipeline):
+        """
+        Visita as publicações uma a uma, extraindo os dados de cada uma.
+        """
         data_id = None
         for _ in range(self.max_downloads):
             try:
-                data_id = self.goto_result(data_id)
-                self.download_data(data_id)
+                with self.metrics.timer("goto_result"):
+                    data_id = self.goto_result(data_id)
+                if data_id is None:
+                    # todas as tentativas falharam (ex: sessão expirada)
+                    raise TimeoutException("Could not reach the next post")
+
+                if self.checkpoint.visit(data_id.split(":")[-1]):
+                    pipeline.put(self.extract_post(data_id))
+                    continue
+
+                # publicação já coletada: apenas avança a rolagem do feed
+                print(f"Skipping post {data_id}, already collected")
+                self.browser.find_element_by_xpath("//body").send_keys(Keys.PAGE_DOWN)
+
+                if self.checkpoint.should_stop(self.stop_after_known):
+                    print("Reached posts already collected. Stopping...")
+                    break
             except NoSuchElementException:
                 print("Unexpected error! Continue to next...")
 
-        self.finalize()
+    def crawl_batches(self, pipeline: CrawlPipeline):
+        """
+        Extrai de uma só vez todas as publicações visíveis no feed e rola a página para carregar as próximas.
+        """
+        max_wait_in_seconds = 10
+        max_scrolls_without_posts = 3
+
+        # aguarda o carregamento do feed
+        WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+            EC.presence_of_element_located(
+                (By.XPATH, "//div[starts-with(@data-id,'urn:li:activity')]")
+            )
+        )
+
+        # os cookies são copiados uma única vez, após o logon ter sido concluído
+        self.downloader.sync_cookies(self.browser)
+
+        visited = set()
+        scrolls_without_posts = 0
+        while len(visited) < self.max_downloads and scrolls_without_posts < max_scrolls_without_posts:
+            records = [
+                record for record in self.extract_visible_posts() if record.post_id not in visited
+            ]
+            scrolls_without_posts = 0 if records else scrolls_without_posts + 1
+
+            for record in records[:self.max_downloads - len(visited)]:
+                visited.add(record.post_id)
+
+                if self.checkpoint.visit(record.post_id):
+                    print(f"Visiting post {record.post_id}")
+                    pipeline.put(record)
+                else:
+                    print(f"Skipping post {record.post_id}, already collected")
+
+                if self.checkpoint.should_stop(self.stop_after_known):
+                    print("Reached posts already collected. Stopping...")
+                    return
+
+            if len(visited) >= self.max_downloads:
+                break
+
+            # rola até o fim da página e aguarda novas publicações
+            number_of_posts = self.browser.execute_script(
+                "window.scrollTo(0, document.body.scrollHeight);"
+                "return document.querySelectorAll(\"div[data-id^='urn:li:activity']\").length;"
+            )
+            try:
+                WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+                    lambda browser: browser.execute_script(
+                        "return document.querySelectorAll(\"div[data-id^='urn:li:activity']\").length;"
+                    ) > number_of_posts
+                )
+            except TimeoutException:
+                print("No new posts after scrolling. Trying again...")
+
+    def restore_session(self) -> bool:
+        """
+        Reaproveita a sessão salva e verifica se ela ainda é válida.
+
+        Returns
+        -------
+        bool
+            False se a sessão não existe ou expirou, e é necessário fazer o logon.
+        """
+        if self.session is None:
+            return False
+
+        # os cookies só podem ser adicionados a partir de uma página do seu domínio
+        self.browser.get(f"{self.base_url}/")
+        self.session.load_cookies(self.browser)
+        self.browser.get(self.search_url)
+
+        max_wait_in_seconds = 10
+        try:
+            WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+                EC.presence_of_element_located((By.XPATH, "//div[starts-with(@data-id,'urn:li:activity')]"))
+            )
+        except TimeoutException:
+            print("Saved session is not valid. Logging in...")
+            return False
+
+        print("Reusing saved session")
+        return True
 
     def launch(self):
         """
@@ -100,31 +338,33 @@ class LinkedInCrawler:
 
         for attempt in range(1, max_attempts + 1):
             try:
-                if previous_data_id is None:
-                    query = "//div[starts-with(@data-id,'urn:li:activity')]"
-                else:
-                    query = f"//div[@data-id='{previous_data_id}']/../following-sibling::div[{attempt}]//div[starts-with(@data-id,'urn:li:activity')]"
-
-                div_element = WebDriverWait(
-                    self.browser, timeout=max_wait_in_seconds
-                ).until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, query)
+                # só espaça a navegação: esperas do DOM não são respostas HTTP e não ajustam os limites
+                with self.rate_limiter.limit(self.base_url, adjust=False):
+                    if previous_data_id is None:
+                        query = "//div[starts-with(@data-id,'urn:li:activity')]"
+                    else:
+                        query = f"//div[@data-id='{previous_data_id}']/../following-sibling::div[{attempt}]//div[starts-with(@data-id,'urn:li:activity')]"
+
+                    div_element = WebDriverWait(
+                        self.browser, timeout=max_wait_in_seconds
+                    ).until(
+                        EC.element_to_be_clickable(
+                            (By.XPATH, query)
+                        )
                     )
-                )
-                data_id = div_element.get_attribute("data-id")
+                    data_id = div_element.get_attribute("data-id")
 
-                self.browser.execute_script("arguments[0].scrollIntoView();", div_element)
+                    self.browser.execute_script("arguments[0].scrollIntoView();", div_element)
 
-                span_element = WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, f"//div[@data-id='{data_id}']//span[contains(@class,'feed-shared-inline-show-more-text__see-more-text')]")
+                    span_element = WebDriverWait(self.browser, timeout=max_wait_in_seconds).until(
+                        EC.element_to_be_clickable(
+                            (By.XPATH, f"//div[@data-id='{data_id}']//span[contains(@class,'feed-shared-inline-show-more-text__see-more-text')]")
+                        )
                     )
-                )
-                span_element.click()
+                    span_element.click()
 
-                print(f"Visiting post {data_id}")
-                return data_id
+                    print(f"Visiting post {data_id}")
+                    return data_id
             except (ElementNotInteractableException, TimeoutException) as e:
                 # BUG
                 # o wait pode acessar elementos invisíveis. neste caso, ocorre uma ElementNotInteractableException.
@@ -133,37 +373,95 @@ class LinkedInCrawler:
                 print(
                     f"Trying again in a few seconds... Attempt {attempt} of {max_attempts}"
                 )
-                sleep(2)
+                self.metrics.increment("retries")
+                if isinstance(e, TimeoutException):
+                    self.metrics.increment("timeouts")
+                with self.metrics.timer("backoff"):
+                    sleep(backoff_delay(attempt))
 
     def download_data(self, data_id):
         """
         Faz o download dos dados de interesse da publicação: imagem, texto, autor e data de publicação.
         """
-        # cria uma pasta para os dados da publicação
-        data_path = os.path.join(self.save_path, data_id.split(":")[-1])
-        os.makedirs(data_path, exist_ok=True)
+        self.save_post(self.extract_post(data_id))
 
-        image_urls = self.find_post_image_urls(data_id)
+    def extract_post(self, data_id: str) -> PostRecord:
+        """
+        Extrai os dados da publicação visitada, sem fazer downloads, e avança a rolagem do feed.
 
-        for index, image_url in enumerate(image_urls):
-            image_filename = f"{index}"
-            image_filepath = os.path.join(data_path, image_filename)
+        Returns
+        -------
+        PostRecord
+        """
+        # os cookies são copiados uma única vez, após o logon ter sido concluído
+        if not self.downloader.cookies_synced:
+            self.downloader.sync_cookies(self.browser)
+
+        with self.metrics.timer("find_post_image_urls"):
+            image_urls = list(self.find_post_image_urls(data_id))
+        with self.metrics.timer("find_post_caption"):
+            caption = self.find_post_caption(data_id)
+        with self.metrics.timer("find_post_author"):
+            author = self.find_post_author(data_id)
+
+        record = PostRecord(
+            post_id=data_id.split(":")[-1],
+            image_urls=image_urls,
+            caption=caption,
+            author=author,
+        )
 
-            self.download_image(image_url, image_filepath)
+        self.browser.find_element_by_xpath("//body").send_keys(Keys.PAGE_DOWN)
 
-        caption = self.find_post_caption(data_id)
-        caption_filename = "caption.txt"
-        caption_filepath = os.path.join(data_path, caption_filename)
-        with open(caption_filepath, "w") as file:
-            file.write(caption)
+        return record
 
-        author = self.find_post_author(data_id)
-        author_filename = "author.txt"
-        author_filepath = os.path.join(data_path, author_filename)
-        with open(author_filepath, "w") as file:
-            file.write(author)
+    def extract_visible_posts(self) -> List[PostRecord]:
+        """
+        Extrai os dados de todas as publicações visíveis no feed com uma única chamada execute_script.
 
-        self.browser.find_element_by_xpath("//body").send_keys(Keys.PAGE_DOWN)
+        Publicações cujas imagens ainda não foram carregadas são ignoradas, e extraídas em uma próxima chamada.
+
+        Returns
+        -------
+        list of PostRecord
+        """
+        with self.metrics.timer("extract_visible_posts") as fields:
+            posts = self.browser.execute_script(EXTRACT_POSTS_SCRIPT)
+            fields["posts"] = len(posts)
+
+        records = []
+        for post in posts:
+            if not any(post["image_urls"]):
+                continue
+
+            records.append(
+                PostRecord(
+                    post_id=post["data_id"].split(":")[-1],
+                    image_urls=post["image_urls"],
+                    caption=post["caption"],
+                    author=post["author"],
+                )
+            )
+        return records
+
+    def save_post(self, record: PostRecord):
+        """
+        Faz o download das imagens e salva o texto e o autor de uma publicação.
+
+        Parameters
+        ----------
+        record : PostRecord
+        """
+        with self.metrics.timer("save_post", post_id=record.post_id):
+            saved = write_post(
+                record, self.save_path, self.downloader, self.metrics, self.dedup_index, self.catalog
+            )
+
+        if saved:
+            self.metrics.increment("posts")
+        else:
+            print(f"Post {record.post_id} was already saved or has no new images. Discarding...")
+        self.checkpoint.add(record.post_id)
 
     def find_post_image_urls(self, data_id: str) -> Generator[str, None, None]:
         """
@@ -187,39 +485,6 @@ class LinkedInCrawler:
 
             yield image_url
 
-    def download_image(self, image_url: Optional[str], image_filepath: str):
-        """
-        Faz o download de uma imagem a partir de uma URL.
-
-        Utiliza os cookies do Selenium para não precisar passar pelo login.
-
-        Parameters
-        ----------
-        image_url : str, optional
-        image_filepath : str
-        """
-        # algumas vezes o elemento img tem src definido. apenas retornamos neste caso
-        if not isinstance(image_url, str):
-            return
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 6.3; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/44.0.2403.157 Safari/537.36"
-        }
-        s = requests.session()
-        s.headers.update(headers)
-
-        for cookie in self.browser.get_cookies():
-            c = {cookie["name"]: cookie["value"]}
-            s.cookies.update(c)
-
-        r = s.get(image_url, allow_redirects=True)
-        extension = mimetypes.guess_extension(
-            r.headers.get("content-type", "").split(";")[0]
-        )
-        image_filepath = f"{image_filepath}{extension}"
-        with open(image_filepath, "wb") as file:
-            file.write(r.content)
-
     def find_post_caption(self, data_id: str) -> str:
         """
         Extrai a descrição da publicação.
@@ -257,6 +522,15 @@ class LinkedInCrawler:
 
     def finalize(self):
         """
-        Fecha o navegador.
+        Salva o checkpoint, fecha o navegador e as conexões do download de imagens, e imprime o resumo da coleta.
+        O navegador é fechado mesmo se um dos passos anteriores falhar.
         """
-        self.browser.quit()
+        try:
+            self.checkpoint.flush()
+            self.downloader.close()
+            if self.dedup_index is not None:
+                self.dedup_index.save()
+            self.catalog.close()
+            self.metrics.close()
+        finally:
+            self.browser.quit()
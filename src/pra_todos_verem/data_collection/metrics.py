@@ -0,0 +1,165 @@
+"""
+Instrumentação da coleta: duração de cada fase, contadores e resumo da execução.
+"""
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentil (nearest-rank) de uma lista de valores.
+
+    Parameters
+    ----------
+    values : list of float
+    q : float
+        Entre 0 e 100.
+
+    Returns
+    -------
+    float
+    """
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(values)) - 1)
+    return values[index]
+
+
+class Metrics:
+    """
+    Registra a duração das fases da coleta (logon, goto_result, extração, download, escrita) e contadores
+    (publicações, retentativas, timeouts).
+
+    Cada evento é escrito como uma linha JSON em path (se definido). Ao final, close() escreve e imprime
+    um resumo: publicações por minuto, p50/p95 de cada fase e os contadores.
+
+    Examples
+    --------
+    metrics = Metrics("metrics.jsonl", website="linkedin", query="pratodosverem")
+    with metrics.timer("download_image", url=url) as fields:
+        r = session.get(url)
+        fields["bytes"] = len(r.content)
+    metrics.increment("posts")
+    metrics.close()
+    """
+
+    def __init__(self, path: Optional[str] = None, **tags):
+        """
+        Parameters
+        ----------
+        path : str, optional
+            Arquivo JSONL onde os eventos são adicionados. Se None, os eventos ficam apenas em memória.
+        **tags
+            Campos incluídos em todos os eventos (ex: website, query).
+        """
+        self.path = path
+        self.tags = tags
+        self.file = open(path, "a", buffering=1) if path is not None else None
+
+        self.durations = defaultdict(list)
+        self.counters = Counter()
+        self.started_at = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, phase: str, **fields):
+        """
+        Mede a duração de um bloco de código e a registra como um evento da fase.
+
+        Os campos podem ser complementados dentro do bloco (ex: bytes, status).
+        Se o bloco levantar uma exceção, o seu nome é registrado no campo error.
+
+        Parameters
+        ----------
+        phase : str
+        **fields
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(phase, time.perf_counter() - start, **fields)
+
+    def record(self, phase: str, duration: float, **fields):
+        """
+        Registra a duração de uma fase.
+
+        Parameters
+        ----------
+        phase : str
+        duration : float
+            Em segundos.
+        **fields
+        """
+        with self.lock:
+            self.durations[phase].append(duration)
+            self.write({"phase": phase, "duration": duration, **fields})
+
+    def increment(self, counter: str, value: int = 1):
+        """
+        Incrementa um contador (ex: posts, retries, timeouts).
+
+        Parameters
+        ----------
+        counter : str
+        value : int
+        """
+        with self.lock:
+            self.counters[counter] += value
+
+    def summary(self) -> Dict:
+        """
+        Resumo da execução.
+
+        Returns
+        -------
+        dict
+        """
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at
+            return {
+                "elapsed": elapsed,
+                "posts_per_minute": 60 * self.counters["posts"] / elapsed if elapsed > 0 else 0.0,
+                "phases": {
+                    phase: {
+                        "count": len(durations),
+                        "total": sum(durations),
+                        "p50": percentile(durations, 50),
+                        "p95": percentile(durations, 95),
+                    }
+                    for phase, durations in self.durations.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def write(self, event: Dict):
+        if self.file is not None:
+            self.file.write(json.dumps({"time": time.time(), **self.tags, **event}) + "\n")
+
+    def close(self):
+        """
+        Escreve e imprime o resumo da execução.
+        """
+        summary = self.summary()
+
+        print(f"Elapsed: {summary['elapsed']:.1f}s - {summary['posts_per_minute']:.2f} posts/min")
+        for phase, stats in summary["phases"].items():
+            print(f"  {phase}: n={stats['count']} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s total={stats['total']:.1f}s")
+        for counter, value in summary["counters"].items():
+            print(f"  {counter}: {value}")
+
+        with self.lock:
+            self.write({"summary": summary})
+            if self.file is not None:
+                self.file.close()
+                self.file = None
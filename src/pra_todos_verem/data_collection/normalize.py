@@ -0,0 +1,430 @@
+"""
+Normalização das imagens coletadas: rasteriza os SVGs, limita a resolução e recodifica tudo em JPEG.
+
+As publicações de <root>/<fonte>/<publicação>/ são copiadas para <output_path>, com o mesmo layout.
+Cada pasta normalizada tem um normalized.json com as dimensões originais e normalizadas de cada imagem.
+Apenas as publicações novas ou alteradas desde a última execução são processadas, e as publicações removidas
+de root também são removidas de output_path.
+
+Examples
+--------
+python -m pra_todos_verem.data_collection.normalize \
+    --root data/raw/ \
+    --output_path data/processed/ \
+    --max_size 1024 \
+    --workers 4
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+from tqdm import tqdm
+
+try:
+    # opcional: requer a biblioteca nativa cairo
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+DESCRIPTION = "Normalização das imagens coletadas do #PraTodosVerem"
+
+# lado maior das imagens normalizadas, em pixels
+DEFAULT_MAX_SIZE = 1024
+
+DEFAULT_QUALITY = 90
+
+# tag EXIF da orientação da foto. 5 a 8 indicam uma rotação de 90 graus
+EXIF_ORIENTATION = 0x0112
+
+# arquivos copiados sem alteração para a pasta normalizada
+TEXT_FILES = ("caption.txt", "author.txt")
+
+
+def open_svg(filepath: str) -> Image.Image:
+    """
+    Rasteriza um SVG no seu tamanho nominal.
+
+    Parameters
+    ----------
+    filepath : str
+
+    Returns
+    -------
+    PIL.Image.Image
+
+    Raises
+    ------
+    OSError
+        Se cairosvg não está instalado.
+    """
+    if cairosvg is None:
+        raise OSError("cairosvg is not installed")
+
+    try:
+        png = cairosvg.svg2png(url=filepath)
+    except Exception as e:
+        # cairosvg levanta exceções de vários tipos para SVGs inválidos
+        raise OSError(f"cannot rasterize {filepath}: {e}") from e
+    return Image.open(io.BytesIO(png))
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """
+    Converte para RGB, compondo as imagens com transparência sobre um fundo branco.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+
+    Returns
+    -------
+    PIL.Image.Image
+    """
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def normalize_image(filepath: str, output_filepath: str, max_size: int, quality: int) -> Tuple[int, int, int, int]:
+    """
+    Salva uma imagem em JPEG, com o lado maior limitado a max_size pixels.
+
+    Parameters
+    ----------
+    filepath : str
+    output_filepath : str
+    max_size : int
+    quality : int
+
+    Returns
+    -------
+    tuple
+        (largura original, altura original, largura, altura).
+
+    Raises
+    ------
+    OSError
+        Se a imagem não pode ser aberta.
+    """
+    if filepath.lower().endswith(".svg"):
+        image = open_svg(filepath)
+    else:
+        image = Image.open(filepath)
+
+    with image:
+        # dimensões já com a rotação da orientação EXIF, lidas do cabeçalho
+        original_width, original_height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            original_width, original_height = original_height, original_width
+
+        # em JPEGs, decodifica direto em escala reduzida (1/2, 1/4 ou 1/8), ainda maior que max_size
+        image.draft("RGB", (max_size, max_size))
+        normalized = to_rgb(ImageOps.exif_transpose(image))
+        normalized.thumbnail((max_size, max_size), Image.LANCZOS)
+        normalized.save(output_filepath, "JPEG", quality=quality, optimize=True)
+
+    return original_width, original_height, normalized.width, normalized.height
+
+
+def normalize_post(task: Tuple[str, str, int, int]) -> Dict:
+    """
+    Normaliza as imagens de uma publicação e copia o texto e o autor para a pasta de saída.
+
+    A pasta é escrita em um diretório temporário e renomeada ao final. As imagens que não podem ser abertas
+    (ex: SVGs sem cairosvg) são registradas em normalized.json com status "flagged".
+
+    Parameters
+    ----------
+    task : tuple
+        (pasta da publicação, pasta de saída, max_size, quality).
+
+    Returns
+    -------
+    dict
+        post_path e images (o conteúdo de normalized.json).
+    """
+    post_path, output_path, max_size, quality = task
+
+    tmp_path = os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}-{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    images = []
+    entries = sorted(os.scandir(post_path), key=lambda entry: (len(entry.name), entry.name))
+    for entry in entries:
+        if entry.name in TEXT_FILES:
+            shutil.copyfile(entry.path, os.path.join(tmp_path, entry.name))
+            continue
+
+        if entry.name.endswith((".txt", ".json", ".dvc")) or entry.name.startswith(".") or not entry.is_file():
+            continue
+
+        filename = f"{os.path.splitext(entry.name)[0]}.jpg"
+        try:
+            original_width, original_height, width, height = normalize_image(
+                entry.path, os.path.join(tmp_path, filename), max_size, quality
+            )
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            images.append({"source_filename": entry.name, "filename": None, "status": "flagged", "error": str(e)})
+            continue
+
+        images.append(
+            {
+                "source_filename": entry.name,
+                "filename": filename,
+                "status": "resized" if (width, height) != (original_width, original_height) else "ok",
+                "original_width": original_width,
+                "original_height": original_height,
+                "width": width,
+                "height": height,
+            }
+        )
+
+    with open(os.path.join(tmp_path, "normalized.json"), "w") as file:
+        json.dump(images, file, indent=2)
+
+    shutil.rmtree(output_path, ignore_errors=True)
+    os.replace(tmp_path, output_path)
+    return {"post_path": post_path, "images": images}
+
+
+class Normalizer:
+    """
+    Normaliza as publicações de root em output_path, em paralelo (multiprocessing.Pool).
+
+    O estado (<output_path>/.normalize.json) guarda o mtime da pasta de cada publicação já normalizada
+    e os parâmetros usados. Apenas as publicações novas ou cujo mtime mudou são processadas; se os parâmetros
+    mudarem, todas são processadas novamente. As pastas normalizadas cuja publicação não existe mais em root
+    (ex: removida pela deduplicação ou à mão) são apagadas na mesma execução. Uma imagem removida de uma
+    publicação muda o mtime da pasta, e a publicação é normalizada de novo, sem a imagem.
+
+    Examples
+    --------
+    normalizer = Normalizer("data/raw/", "data/processed/", max_size=1024)
+    normalizer.run(workers=4)
+    """
+
+    def __init__(
+        self,
+        root: str,
+        output_path: str,
+        max_size: int = DEFAULT_MAX_SIZE,
+        quality: int = DEFAULT_QUALITY,
+    ):
+        """
+        Parameters
+        ----------
+        root : str
+            Diretório dos dados 'raw'.
+        output_path : str
+            Diretório dos dados normalizados.
+        max_size : int
+            Lado maior das imagens normalizadas, em pixels.
+        quality : int
+            Qualidade JPEG.
+        """
+        self.root = root
+        self.output_path = output_path
+        self.max_size = max_size
+        self.quality = quality
+        self.state_path = os.path.join(output_path, ".normalize.json")
+
+        # {"<fonte>/<publicação>": mtime da pasta, em nanosegundos}
+        self.posts = {}
+        self.load()
+
+    @property
+    def params(self) -> Dict:
+        return {"max_size": self.max_size, "quality": self.quality}
+
+    def load(self):
+        """
+        Lê o estado, se existir e tiver sido gerado com os mesmos parâmetros.
+        """
+        if not os.path.exists(self.state_path):
+            return
+
+        with open(self.state_path, "r") as file:
+            state = json.load(file)
+
+        if state["params"] == self.params:
+            self.posts = state["posts"]
+        else:
+            print("Normalization parameters changed. Processing all posts again...")
+
+    def save(self):
+        """
+        Escreve o estado atomicamente.
+        """
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"params": self.params, "posts": self.posts}, file, separators=(",", ":"))
+        os.replace(tmp_path, self.state_path)
+
+    def pending(self) -> List[Tuple[str, int]]:
+        """
+        Publicações novas ou alteradas desde a última normalização.
+
+        Returns
+        -------
+        list of tuple
+            (chave <fonte>/<publicação>, mtime da pasta).
+        """
+        pending = []
+        for source in sorted(os.scandir(self.root), key=lambda entry: entry.name):
+            if not source.is_dir() or source.name.startswith("."):
+                continue
+
+            for post in os.scandir(source.path):
+                if not post.is_dir() or post.name.startswith("."):
+                    continue
+
+                key = f"{source.name}/{post.name}"
+                mtime = post.stat().st_mtime_ns
+                if self.posts.get(key) != mtime:
+                    pending.append((key, mtime))
+
+        return pending
+
+    def removed(self) -> List[str]:
+        """
+        Publicações normalizadas (ou registradas no estado) cuja pasta não existe mais em root.
+
+        Returns
+        -------
+        list of str
+            Chaves <fonte>/<publicação>.
+        """
+        keys = set(self.posts)
+        if os.path.isdir(self.output_path):
+            for source in os.scandir(self.output_path):
+                if not source.is_dir() or source.name.startswith("."):
+                    continue
+
+                keys.update(
+                    f"{source.name}/{post.name}"
+                    for post in os.scandir(source.path)
+                    if post.is_dir() and not post.name.startswith(".")
+                )
+
+        return sorted(key for key in keys if not os.path.isdir(os.path.join(self.root, *key.split("/"))))
+
+    def run(self, workers: Optional[int] = None, save_every: int = 100) -> Dict:
+        """
+        Normaliza as publicações pendentes.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Total de processos. Default: os.cpu_count().
+        save_every : int
+            O estado é salvo a cada save_every publicações, para retomar uma execução interrompida.
+
+        Returns
+        -------
+        dict
+            Total de publicações, de publicações removidas e de imagens por status.
+        """
+        pending = self.pending()
+        removed = self.removed()
+        os.makedirs(self.output_path, exist_ok=True)
+
+        for key in removed:
+            shutil.rmtree(os.path.join(self.output_path, *key.split("/")), ignore_errors=True)
+            self.posts.pop(key, None)
+
+        mtimes = dict(pending)
+        tasks = [
+            (
+                os.path.join(self.root, *key.split("/")),
+                os.path.join(self.output_path, *key.split("/")),
+                self.max_size,
+                self.quality,
+            )
+            for key, _ in pending
+        ]
+        for _, output_post_path, _, _ in tasks:
+            os.makedirs(os.path.dirname(output_post_path), exist_ok=True)
+
+        totals = {"posts": 0, "removed": len(removed), "ok": 0, "resized": 0, "flagged": 0}
+        with multiprocessing.Pool(processes=workers) as pool:
+            results = pool.imap_unordered(normalize_post, tasks, chunksize=4)
+            for result in tqdm(results, total=len(tasks), desc="Normalizing"):
+                key = os.path.relpath(result["post_path"], self.root).replace(os.sep, "/")
+                self.posts[key] = mtimes[key]
+
+                totals["posts"] += 1
+                for image in result["images"]:
+                    totals[image["status"]] += 1
+                    if image["status"] == "flagged":
+                        print(f"Flagged {key}/{image['source_filename']}: {image['error']}")
+
+                if totals["posts"] % save_every == 0:
+                    self.save()
+
+        self.save()
+        return totals
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default="data/raw/",
+        help="Diretório dos dados 'raw'",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="data/processed/",
+        help="Diretório onde salvar os dados normalizados",
+    )
+    parser.add_argument(
+        "--max_size",
+        type=int,
+        default=DEFAULT_MAX_SIZE,
+        help="Lado maior das imagens normalizadas, em pixels",
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help="Qualidade JPEG das imagens normalizadas",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Total de processos. Default: total de CPUs",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    if cairosvg is None:
+        print("cairosvg is not installed. SVG images will be flagged instead of rasterized")
+
+    normalizer = Normalizer(args.root, args.output_path, args.max_size, args.quality)
+    totals = normalizer.run(args.workers)
+    print(
+        f"Normalized {totals['posts']} posts: {totals['ok']} images kept at their size, "
+        f"{totals['resized']} resized, {totals['flagged']} flagged. Removed {totals['removed']} posts no longer in "
+        f"{args.root}"
+    )
@@ -0,0 +1,245 @@
+"""
+Pipeline produtor/consumidor que separa a navegação do download dos dados.
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+from pra_todos_verem.data_collection.catalog import Catalog, image_dimensions
+from pra_todos_verem.data_collection.dedup import DEFAULT_MAX_DISTANCE, HashIndex, hash_file
+from pra_todos_verem.data_collection.downloader import ImageDownloader
+from pra_todos_verem.data_collection.metrics import Metrics
+
+
+class PostRecord(NamedTuple):
+    """
+    Dados de uma publicação extraídos pelo navegador, ainda não salvos.
+    """
+
+    post_id: str
+    image_urls: List[Optional[str]]
+    caption: str
+    author: str
+
+
+def write_post(
+    record: PostRecord,
+    save_path: str,
+    downloader: ImageDownloader,
+    metrics: Optional[Metrics] = None,
+    dedup_index: Optional[HashIndex] = None,
+    catalog: Optional[Catalog] = None,
+) -> bool:
+    """
+    Faz o download das imagens e salva o texto e o autor de uma publicação em <save_path>/<post_id>.
+
+    Os arquivos são escritos em uma pasta temporária, renomeada ao final. Assim, vários processos podem
+    escrever no mesmo save_path: uma publicação já salva por outro processo é descartada.
+    O tamanho e o sha256 de cada imagem são registrados em images.json. Uma publicação sem nenhuma imagem
+    (ex: todas descartadas por dedup_index) não é salva nem registrada no catálogo.
+
+    Parameters
+    ----------
+    record : PostRecord
+    save_path : str
+    downloader : ImageDownloader
+    metrics : Metrics, optional
+        Registra a duração da escrita dos arquivos.
+    dedup_index : HashIndex, optional
+        Imagens quase idênticas a uma imagem do índice, inclusive às imagens anteriores da mesma publicação,
+        são descartadas antes de a publicação ser salva. As demais são adicionadas ao índice.
+    catalog : Catalog, optional
+        Registra a publicação salva (autor, texto, data e tamanho, sha256 e dimensões das imagens).
+        A fonte é o nome da pasta save_path (ex: linkedin).
+
+    Returns
+    -------
+    bool
+        False se a publicação já havia sido salva ou se não restou nenhuma imagem para salvar.
+    """
+    data_path = os.path.join(save_path, record.post_id)
+    if os.path.isdir(data_path):
+        return False
+
+    # cria uma pasta temporária, única por processo e thread, para os dados da publicação
+    tmp_path = os.path.join(save_path, f".{record.post_id}-{os.getpid()}-{threading.get_ident()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    if metrics is None:
+        metrics = downloader.metrics
+
+    # imagens adicionadas ao índice de hashes, removidas se a publicação não for salva
+    keys = []
+    try:
+        results = [result for result in downloader.download_images(record.image_urls, tmp_path) if result is not None]
+
+        if dedup_index is not None:
+            for result in list(results):
+                hash_value = hash_file(result.filepath)
+                if hash_value is None:
+                    continue
+
+                # a imagem entra no índice já com o caminho final, e as seguintes (desta ou de outras publicações)
+                # são comparadas com ela
+                key = os.path.relpath(os.path.join(data_path, os.path.basename(result.filepath)), dedup_index.root)
+                if not dedup_index.add_if_new(key, hash_value, DEFAULT_MAX_DISTANCE):
+                    os.remove(result.filepath)
+                    results.remove(result)
+                    metrics.increment("duplicates")
+                    continue
+
+                keys.append(key)
+
+        if not results:
+            # sem imagens (ex: todas quase idênticas a imagens já coletadas), a publicação teria apenas o texto
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return False
+
+        images_filepath = os.path.join(tmp_path, "images.json")
+        with metrics.timer("write_file", path=images_filepath):
+            with open(images_filepath, "w") as file:
+                json.dump(
+                    [
+                        {
+                            "filename": os.path.basename(result.filepath),
+                            "url": result.url,
+                            "size": result.size,
+                            "sha256": result.sha256,
+                        }
+                        for result in results
+                    ],
+                    file,
+                    indent=2,
+                )
+
+        caption_filepath = os.path.join(tmp_path, "caption.txt")
+        with metrics.timer("write_file", path=caption_filepath):
+            with open(caption_filepath, "w") as file:
+                file.write(record.caption)
+
+        author_filepath = os.path.join(tmp_path, "author.txt")
+        with metrics.timer("write_file", path=author_filepath):
+            with open(author_filepath, "w") as file:
+                file.write(record.author)
+    except BaseException:
+        # não deixa a pasta temporária para trás se o download ou a escrita falhar
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if keys:
+            dedup_index.remove(keys)
+        raise
+
+    try:
+        os.rename(tmp_path, data_path)
+    except OSError:
+        # outro processo salvou a mesma publicação enquanto esta era baixada
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if keys:
+            dedup_index.remove(keys)
+        return False
+
+    if catalog is not None:
+        images = []
+        for result in results:
+            filepath = os.path.join(data_path, os.path.basename(result.filepath))
+            width, height = image_dimensions(filepath)
+            images.append(
+                {
+                    "filename": os.path.basename(result.filepath),
+                    "path": os.path.relpath(filepath, catalog.root),
+                    "url": result.url,
+                    "size": result.size,
+                    "sha256": result.sha256,
+                    "width": width,
+                    "height": height,
+                }
+            )
+        catalog.add_post(
+            os.path.basename(os.path.normpath(save_path)), record.post_id, record.author, record.caption, images
+        )
+
+    return True
+
+
+class CrawlPipeline:
+    """
+    Fila limitada de publicações consumida por threads que fazem o download e a escrita em disco.
+
+    A thread do navegador apenas extrai as publicações e as coloca na fila (put),
+    enquanto as threads de trabalho chamam save_fn para cada publicação.
+    Com num_workers=0 não há fila: save_fn é chamada na própria thread de put.
+
+    Examples
+    --------
+    with CrawlPipeline(crawler.save_post, num_workers=2) as pipeline:
+        pipeline.put(record)
+    """
+
+    def __init__(
+        self,
+        save_fn: Callable[[PostRecord], None],
+        num_workers: int = 2,
+        max_queue_size: int = 16,
+    ):
+        self.save_fn = save_fn
+        self.num_workers = num_workers
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Inicia as threads de trabalho.
+        """
+        for _ in range(self.num_workers):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def put(self, record: PostRecord):
+        """
+        Enfileira uma publicação. Bloqueia enquanto a fila estiver cheia.
+
+        Parameters
+        ----------
+        record : PostRecord
+        """
+        if not self.workers:
+            self.save_fn(record)
+            return
+
+        self.queue.put(record)
+
+    def close(self):
+        """
+        Aguarda o esvaziamento da fila e encerra as threads de trabalho.
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.workers = []
+
+    def _work(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+
+            try:
+                self.save_fn(record)
+            except Exception as e:
+                # uma falha no download de uma publicação não deve interromper as demais
+                print(e)
+                print(f"Failed to save post {record.post_id}! Continue to next...")
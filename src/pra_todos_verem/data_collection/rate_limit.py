@@ -0,0 +1,245 @@
+"""
+Limite adaptativo de requisições por host, compartilhado pela navegação e pelo download de imagens.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# status HTTP que indicam sobrecarga do servidor: reduzem a taxa e a concorrência
+THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, max_delay: float = 60.0) -> float:
+    """
+    Espera antes de uma nova tentativa: exponencial com jitter ("full jitter").
+
+    O sorteio evita que várias threads (ou processos) tentem novamente ao mesmo tempo.
+
+    Parameters
+    ----------
+    attempt : int
+        Número da tentativa que falhou, a partir de 1.
+    base : float
+        Em segundos.
+    max_delay : float
+        Em segundos.
+
+    Returns
+    -------
+    float
+        Em segundos, entre 0 e min(max_delay, base * 2 ** (attempt - 1)).
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** (attempt - 1)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Lê o header Retry-After, quando informado em segundos.
+
+    Parameters
+    ----------
+    value : str, optional
+
+    Returns
+    -------
+    float, optional
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    Limites de um host: um token bucket (requisições por segundo) e um limite de requisições simultâneas.
+
+    Ambos se ajustam com AIMD: cada resposta rápida e bem-sucedida aumenta os limites aos poucos,
+    e cada resposta 429/5xx, timeout ou latência muito acima da média os reduz pela metade.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        max_rate: float = 20.0,
+        min_rate: float = 0.2,
+        concurrency: int = 4,
+        max_concurrency: int = 16,
+        latency_factor: float = 3.0,
+    ):
+        """
+        Parameters
+        ----------
+        rate : float
+            Requisições por segundo iniciais.
+        max_rate : float
+        min_rate : float
+        concurrency : int
+            Requisições simultâneas iniciais.
+        max_concurrency : int
+        latency_factor : float
+            Uma resposta mais lenta que latency_factor vezes a latência média conta como sobrecarga.
+        """
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.latency_factor = latency_factor
+
+        self.condition = threading.Condition()
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.active = 0
+        self.latency = None
+        self.blocked_until = 0.0
+
+    def acquire(self):
+        """
+        Bloqueia até haver um token e uma vaga de concorrência.
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.active >= int(self.concurrency):
+                    wait = None
+                elif self.tokens < 1.0:
+                    wait = (1.0 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1.0
+                    self.active += 1
+                    return
+
+                # release() acorda as threads que esperam por uma vaga
+                self.condition.wait(timeout=wait)
+
+    def release(
+        self,
+        latency: float,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        adjust: bool = True,
+    ):
+        """
+        Libera a vaga de uma requisição e ajusta os limites a partir do seu resultado.
+
+        Parameters
+        ----------
+        latency : float
+            Em segundos.
+        status : int, optional
+            Status HTTP. None indica um erro de conexão ou timeout.
+        retry_after : float, optional
+            Header Retry-After, em segundos: nenhuma requisição é feita ao host até lá.
+        adjust : bool
+            False apenas libera a vaga, sem ajustar os limites (ex: navegação, cujo resultado não é um status HTTP).
+        """
+        with self.condition:
+            self.active -= 1
+
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+            if not adjust:
+                self.condition.notify_all()
+                return
+
+            slow = self.latency is not None and latency > self.latency_factor * self.latency
+            if status is None or status in THROTTLE_STATUS or slow:
+                # multiplicative decrease
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.concurrency = max(1.0, self.concurrency / 2)
+            elif status < 400:
+                # additive increase: +1 de concorrência a cada `concurrency` respostas
+                self.rate = min(self.max_rate, self.rate + 0.1)
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+
+            if status is not None and status < 400:
+                # média móvel exponencial da latência das respostas bem-sucedidas
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+            self.condition.notify_all()
+
+
+class RateLimiter:
+    """
+    Agenda as requisições de um crawler: um HostLimiter por host, criado no primeiro acesso.
+
+    Examples
+    --------
+    limiter = RateLimiter()
+    with limiter.limit(url) as request:
+        r = session.get(url)
+        request["status"] = r.status_code
+    """
+
+    def __init__(self, unlimited: bool = False, **host_kwargs):
+        """
+        Parameters
+        ----------
+        unlimited : bool
+            Não limita nem ajusta as requisições (ex: benchmarks contra um servidor local).
+        host_kwargs
+            Parâmetros de cada HostLimiter.
+        """
+        self.unlimited = unlimited
+        self.host_kwargs = host_kwargs
+        self.hosts: Dict[str, HostLimiter] = {}
+        self.lock = threading.Lock()
+
+    def host(self, url: str) -> HostLimiter:
+        """
+        HostLimiter do host de uma URL.
+
+        Parameters
+        ----------
+        url : str
+
+        Returns
+        -------
+        HostLimiter
+        """
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = HostLimiter(**self.host_kwargs)
+            return self.hosts[netloc]
+
+    @contextmanager
+    def limit(self, url: str, adjust: bool = True):
+        """
+        Aguarda a vez de uma requisição ao host da URL e registra o seu resultado.
+
+        O dict retornado deve receber o status da resposta (chave "status") e, se houver, o header Retry-After
+        (chave "retry_after"). Sem status, a requisição conta como erro de conexão. A latência é o tempo dentro
+        do bloco, a menos que seja informada (chave "latency", ex: o tempo até os headers de um download).
+
+        Parameters
+        ----------
+        url : str
+        adjust : bool
+            False apenas espaça as requisições, sem ajustar os limites do host a partir do resultado
+            (ex: a navegação do Selenium, em que um timeout é uma espera do DOM e não uma sobrecarga do servidor).
+        """
+        request = {"status": None, "retry_after": None, "latency": None}
+        if self.unlimited:
+            yield request
+            return
+
+        host = self.host(url)
+        host.acquire()
+
+        start = time.monotonic()
+        try:
+            yield request
+        finally:
+            latency = request["latency"] if request["latency"] is not None else time.monotonic() - start
+            host.release(latency, request["status"], request["retry_after"], adjust)
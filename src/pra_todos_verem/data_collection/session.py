@@ -0,0 +1,75 @@
+"""
+Sessão do navegador persistida entre execuções: perfil do Firefox e cookies.
+"""
+import json
+import os
+
+from selenium.common.exceptions import WebDriverException
+
+
+class BrowserSession:
+    """
+    Perfil do Firefox e cookies de um website, reaproveitados entre execuções para evitar um novo logon.
+
+    Estrutura do diretório:
+    - <path>/profile-<query>/ : perfil do Firefox. Um por query, pois um perfil não pode ser aberto
+      por dois navegadores ao mesmo tempo (ex: --workers).
+    - <path>/cookies.json : cookies do website, compartilhados entre as queries.
+    """
+
+    def __init__(self, path: str, query: str):
+        """
+        Parameters
+        ----------
+        path : str
+            Diretório da sessão de um website.
+        query : str
+        """
+        self.path = path
+        self.profile_path = os.path.join(path, f"profile-{query.lower()}")
+        self.cookies_path = os.path.join(path, "cookies.json")
+
+        os.makedirs(self.profile_path, exist_ok=True)
+
+    def load_cookies(self, browser) -> bool:
+        """
+        Adiciona ao navegador os cookies salvos.
+
+        O navegador precisa estar em uma página do domínio dos cookies.
+
+        Parameters
+        ----------
+        browser : selenium.webdriver.Firefox
+
+        Returns
+        -------
+        bool
+            False se não há cookies salvos.
+        """
+        if not os.path.exists(self.cookies_path):
+            return False
+
+        with open(self.cookies_path, "r") as file:
+            cookies = json.load(file)
+
+        for cookie in cookies:
+            try:
+                browser.add_cookie(cookie)
+            except WebDriverException as e:
+                # cookies de outros domínios (ou já expirados) são recusados pelo navegador
+                print(e)
+
+        return len(cookies) > 0
+
+    def save_cookies(self, browser):
+        """
+        Salva os cookies atuais do navegador.
+
+        Parameters
+        ----------
+        browser : selenium.webdriver.Firefox
+        """
+        tmp_path = f"{self.cookies_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(browser.get_cookies(), file)
+        os.replace(tmp_path, self.cookies_path)
@@ -1,3 +1,25 @@
+from .batching import AspectRatioBucketSampler, collate_fn
+from .captions import CaptionStore
+from .dvc_cache import DVCCache, DVCManifest
+from .image_cache import ImageCache
+from .manifest import CatalogManifest, Manifest
 from .pra_todos_verem import PraTodosVerem
+from .sample_index import SampleIndex
+from .shards import PraTodosVeremShards, pack_shards
+from .streaming import PraTodosVeremStream
 
-__all__ = ["PraTodosVerem"]
+__all__ = [
+    "AspectRatioBucketSampler",
+    "CaptionStore",
+    "CatalogManifest",
+    "DVCCache",
+    "DVCManifest",
+    "ImageCache",
+    "Manifest",
+    "PraTodosVerem",
+    "PraTodosVeremShards",
+    "PraTodosVeremStream",
+    "SampleIndex",
+    "collate_fn",
+    "pack_shards",
+]
@@ -0,0 +1,153 @@
+"""
+Batching of #PraTodosVerem samples, whose images have different sizes.
+"""
+import math
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Sampler
+
+# boundaries of the aspect ratio (width / height) buckets
+ASPECT_RATIO_BOUNDARIES = (0.6, 0.8, 0.95, 1.05, 1.25, 1.6)
+
+
+def collate_fn(batch: Sequence[Tuple[torch.Tensor, str]], size: Optional[Tuple[int, int]] = None):
+    """
+    Merges (image, caption) samples into a batch.
+
+    Images are padded with zeros (right and bottom) to the largest height and width in the batch,
+    or resized to size if given. Use with functools.partial to set size.
+
+    Parameters
+    ----------
+    batch : sequence of tuple
+        Samples as returned by PraTodosVerem: images of shape (1, 3, height, width) or (3, height, width).
+    size : tuple, optional
+        (height, width) to resize all images to.
+
+    Returns
+    -------
+    tuple
+        images : torch.Tensor (batch_size, 3, height, width)
+        captions : list of str
+
+    Examples
+    --------
+    loader = DataLoader(ptv, batch_sampler=AspectRatioBucketSampler(ptv.sizes, 32), collate_fn=collate_fn)
+    """
+    images = [image.squeeze(0) if image.dim() == 4 else image for image, _ in batch]
+    captions = [caption for _, caption in batch]
+
+    if size is not None:
+        images = [
+            F.interpolate(image.unsqueeze(0), size=size, mode="bilinear", align_corners=False).squeeze(0)
+            for image in images
+        ]
+        return torch.stack(images), captions
+
+    height = max(image.shape[1] for image in images)
+    width = max(image.shape[2] for image in images)
+    batched = images[0].new_zeros((len(images), images[0].shape[0], height, width))
+    for i, image in enumerate(images):
+        batched[i, :, :image.shape[1], :image.shape[2]] = image
+
+    return batched, captions
+
+
+class AspectRatioBucketSampler(Sampler):
+    """
+    Batch sampler that only groups samples with a similar aspect ratio, so that little padding
+    (or distortion, when resizing) is needed within a batch.
+
+    Within a bucket, samples are sorted by area before being split into batches, which also keeps
+    the padded size close to the actual image sizes. When shuffling, samples are then shuffled within windows
+    of shuffle_window batches of similar area (with window boundaries that move every epoch), so batch
+    composition changes from epoch to epoch, not only the batch order.
+
+    Examples
+    --------
+    sampler = AspectRatioBucketSampler(ptv.sizes, batch_size=32, shuffle=True)
+    loader = DataLoader(ptv, batch_sampler=sampler, collate_fn=collate_fn, num_workers=4)
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch)
+        for images, captions in loader:
+            ...
+    """
+
+    def __init__(
+        self,
+        sizes: Sequence[Tuple[int, int]],
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        boundaries: Sequence[float] = ASPECT_RATIO_BOUNDARIES,
+        seed: int = 0,
+        shuffle_window: int = 4,
+    ):
+        """
+        Parameters
+        ----------
+        sizes : sequence of tuple
+            (width, height) of each sample, e.g. PraTodosVerem.sizes.
+        batch_size : int
+        shuffle : bool
+            Shuffles the samples within each bucket and the order of the batches, on every epoch.
+        drop_last : bool
+            Drops the last incomplete batch of each bucket.
+        boundaries : sequence of float
+            Aspect ratios (width / height) that delimit the buckets.
+        seed : int
+        shuffle_window : int
+            Samples are shuffled within windows of shuffle_window * batch_size samples of similar area.
+            Larger windows mix more, at the cost of more padding.
+        """
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.shuffle_window = shuffle_window
+        self.epoch = 0
+
+        sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+        self.areas = sizes[:, 0] * sizes[:, 1]
+        buckets = np.digitize(sizes[:, 0] / sizes[:, 1], boundaries)
+        self.buckets = [np.flatnonzero(buckets == bucket) for bucket in np.unique(buckets)]
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return sum(len(bucket) // self.batch_size for bucket in self.buckets)
+        return sum(math.ceil(len(bucket) / self.batch_size) for bucket in self.buckets)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        rng = np.random.default_rng((self.seed, self.epoch))
+
+        batches = []
+        for bucket in self.buckets:
+            bucket = bucket[np.argsort(self.areas[bucket], kind="stable")]
+            if self.shuffle:
+                window = max(1, self.shuffle_window * self.batch_size)
+                splits = np.arange(rng.integers(window), len(bucket), window)
+                bucket = np.concatenate([rng.permutation(part) for part in np.split(bucket, splits)])
+
+            for start in range(0, len(bucket), self.batch_size):
+                batch = bucket[start:start + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        return iter(batches)
+
+    def set_epoch(self, epoch: int):
+        """
+        Sets the epoch, so that each epoch is shuffled differently.
+
+        Parameters
+        ----------
+        epoch : int
+        """
+        self.epoch = epoch
@@ -0,0 +1,290 @@
+"""
+Throughput benchmark of the #PraTodosVerem dataset.
+
+Times each phase of loading a sample (index construction, file open, decode, convert, tensor conversion and
+caption load), then the end-to-end samples/s of a DataLoader over a sweep of num_workers and batch sizes.
+By default runs on a synthetic dataset with the same layout as data/raw, so results are comparable across
+loader changes.
+
+Examples
+--------
+python -m pra_todos_verem.datasets.bench \
+    --num_posts 500 \
+    --num_workers 0,2,4 \
+    --batch_sizes 1,8,32 \
+    --output bench_dataset.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import DataLoader
+from torchvision import transforms
+
+from .batching import AspectRatioBucketSampler, collate_fn
+from .pra_todos_verem import PraTodosVerem
+
+DESCRIPTION = "Benchmark do carregamento do dataset #PraTodosVerem"
+
+# aspect ratios (width, height) of the synthetic images, as in the crawled posts
+ASPECT_RATIOS = ((1, 1), (4, 5), (16, 9), (3, 4), (1.91, 1))
+
+
+def make_synthetic_dataset(
+    root: str,
+    num_posts: int = 200,
+    images_per_post: int = 2,
+    image_size: int = 1080,
+    seed: int = 0,
+):
+    """
+    Writes a synthetic dataset with the layout of data/raw: <root>/<source>/<post_id>/<ordinal>.jpg,
+    caption.txt and author.txt.
+
+    Parameters
+    ----------
+    root : str
+    num_posts : int
+    images_per_post : int
+    image_size : int
+        Longer side of the images, in pixels.
+    seed : int
+    """
+    rng = np.random.default_rng(seed)
+    for i in range(num_posts):
+        source = "linkedin" if i % 2 == 0 else "instagram"
+        post_path = os.path.join(root, source, str(6986131346825859072 + i))
+        os.makedirs(post_path, exist_ok=True)
+
+        for ordinal in range(images_per_post):
+            width, height = ASPECT_RATIOS[rng.integers(len(ASPECT_RATIOS))]
+            scale = image_size / max(width, height)
+            size = (round(width * scale), round(height * scale))
+
+            # a smooth gradient plus noise compresses like a photo, unlike pure noise
+            gradient = np.linspace(0, 255, size[0], dtype=np.float32)[None, :, None]
+            noise = rng.normal(0, 24, (size[1], size[0], 3)).astype(np.float32)
+            pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(os.path.join(post_path, f"{ordinal}.jpg"), quality=90)
+
+        with open(os.path.join(post_path, "caption.txt"), "w") as file:
+            file.write(f"#PraTodosVerem post {i}. " * 20)
+        with open(os.path.join(post_path, "author.txt"), "w") as file:
+            file.write(f"author {i}")
+
+
+def time_phases(root: str, num_samples: int = 100, image_size: Optional[int] = None) -> Dict:
+    """
+    Times the phases of loading a sample, in milliseconds.
+
+    Parameters
+    ----------
+    root : str
+    num_samples : int
+    image_size : int, optional
+        Target size of the dataset (PraTodosVerem image_size).
+
+    Returns
+    -------
+    dict
+        index_cold and index_warm (construction without and with the persisted manifest and captions),
+        and the mean time per sample of open, decode, convert, to_tensor, caption and getitem.
+    """
+    # the manifest and captions are written to a temporary folder, the caches under root are left untouched
+    cache_path = tempfile.mkdtemp()
+    paths = {
+        "manifest_path": os.path.join(cache_path, ".manifest.json"),
+        "captions_path": os.path.join(cache_path, ".captions"),
+    }
+
+    results = {}
+    try:
+        start = time.perf_counter()
+        PraTodosVerem(root, image_size=image_size, **paths)
+        results["index_cold"] = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        dataset = PraTodosVerem(root, image_size=image_size, **paths)
+        results["index_warm"] = (time.perf_counter() - start) * 1e3
+
+        phases = {phase: [] for phase in ("open", "decode", "convert", "to_tensor", "caption", "getitem")}
+        for index in range(min(num_samples, len(dataset))):
+            start = time.perf_counter()
+            image = Image.open(os.path.join(root, dataset.index.filepath(index)))
+            phases["open"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            image.load()
+            phases["decode"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            image = image.convert("RGB")
+            phases["convert"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            transforms.functional.to_tensor(image)
+            phases["to_tensor"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            dataset.load_target(index)
+            phases["caption"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            dataset[index]
+            phases["getitem"].append(time.perf_counter() - start)
+
+        for phase, values in phases.items():
+            results[phase] = float(np.mean(values)) * 1e3 if values else 0.0
+    finally:
+        shutil.rmtree(cache_path, ignore_errors=True)
+
+    return results
+
+
+def time_loader(dataset: PraTodosVerem, num_workers: int, batch_size: int, max_samples: int = 1000) -> Dict:
+    """
+    Measures the end-to-end throughput of a DataLoader.
+
+    Parameters
+    ----------
+    dataset : PraTodosVerem
+    num_workers : int
+    batch_size : int
+    max_samples : int
+        Stops after this many samples.
+
+    Returns
+    -------
+    dict
+    """
+    sampler = AspectRatioBucketSampler(dataset.sizes, batch_size, shuffle=True)
+    loader = DataLoader(dataset, batch_sampler=sampler, collate_fn=collate_fn, num_workers=num_workers)
+
+    samples = 0
+    start = time.perf_counter()
+    for images, _ in loader:
+        samples += len(images)
+        if samples >= max_samples:
+            break
+    elapsed = time.perf_counter() - start
+
+    return {
+        "num_workers": num_workers,
+        "batch_size": batch_size,
+        "samples": samples,
+        "elapsed": elapsed,
+        "samples_per_second": samples / elapsed,
+    }
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=None,
+        help="Diretório de um dataset existente. Por padrão, gera um dataset sintético temporário",
+    )
+    parser.add_argument(
+        "--num_posts",
+        type=int,
+        default=200,
+        help="Total de publicações do dataset sintético",
+    )
+    parser.add_argument(
+        "--images_per_post",
+        type=int,
+        default=2,
+        help="Imagens por publicação do dataset sintético",
+    )
+    parser.add_argument(
+        "--synthetic_image_size",
+        type=int,
+        default=1080,
+        help="Lado maior das imagens do dataset sintético, em pixels",
+    )
+    parser.add_argument(
+        "--image_size",
+        type=int,
+        default=None,
+        help="Lado maior das imagens carregadas, em pixels. Por padrão, o tamanho original",
+    )
+    parser.add_argument(
+        "--num_samples",
+        type=int,
+        default=100,
+        help="Total de amostras cronometradas por fase",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=str,
+        default="0,2,4",
+        help="Valores de num_workers do DataLoader, separados por vírgula",
+    )
+    parser.add_argument(
+        "--batch_sizes",
+        type=str,
+        default="1,8,32",
+        help="Tamanhos de lote, separados por vírgula",
+    )
+    parser.add_argument(
+        "--max_samples",
+        type=int,
+        default=1000,
+        help="Total de amostras carregadas em cada configuração do DataLoader",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Arquivo JSON onde salvar os resultados",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    root = args.root
+    if root is None:
+        root = tempfile.mkdtemp()
+        make_synthetic_dataset(root, args.num_posts, args.images_per_post, args.synthetic_image_size)
+
+    try:
+        phases = time_phases(root, args.num_samples, args.image_size)
+        print(f"{'phase':<12} {'ms':>10}")
+        for phase, value in phases.items():
+            print(f"{phase:<12} {value:>10.2f}")
+
+        dataset = PraTodosVerem(root, image_size=args.image_size)
+        loaders = []
+        for num_workers in map(int, args.num_workers.split(",")):
+            for batch_size in map(int, args.batch_sizes.split(",")):
+                loaders.append(time_loader(dataset, num_workers, batch_size, args.max_samples))
+
+        print(f"{'num_workers':>11} {'batch_size':>10} {'samples/s':>10}")
+        for result in loaders:
+            print(f"{result['num_workers']:>11} {result['batch_size']:>10} {result['samples_per_second']:>10.1f}")
+    finally:
+        if args.root is None:
+            shutil.rmtree(root)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(
+                {"samples": len(dataset), "image_size": args.image_size, "phases": phases, "loaders": loaders},
+                file,
+                indent=2,
+            )
@@ -0,0 +1,107 @@
+"""
+Compact, memory-mapped store of the #PraTodosVerem captions.
+"""
+import os
+from typing import Iterable
+
+import numpy as np
+
+
+class CaptionStore:
+    """
+    All captions in one concatenated UTF-8 buffer plus an array of offsets.
+
+    Stored as two files: <path>.bin (the buffer, memory-mapped) and <path>.npz (offsets and a fingerprint
+    of the posts the captions were built from). The buffer is opened lazily in each process, so DataLoader
+    workers share its pages instead of pickling or copying the captions.
+
+    Examples
+    --------
+    store = CaptionStore("data/raw/.captions")
+    if not store.is_valid(fingerprint):
+        store.build(captions, fingerprint)
+    print(store[3])
+    """
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path : str
+            Path prefix of the store files.
+        """
+        self.path = path
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.fingerprint = None
+        self._buffer = None
+
+        if os.path.exists(f"{path}.npz") and os.path.exists(f"{path}.bin"):
+            with np.load(f"{path}.npz") as data:
+                self.offsets = data["offsets"]
+                self.fingerprint = str(data["fingerprint"])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.buffer[start:end].tobytes().decode("utf-8")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buffer"] = None
+        return state
+
+    @property
+    def buffer(self) -> np.ndarray:
+        """
+        The memory-mapped UTF-8 buffer, opened on first access.
+        """
+        if self._buffer is None:
+            if self.offsets[-1] == 0:
+                # an empty file can not be memory-mapped
+                self._buffer = np.zeros(0, dtype=np.uint8)
+            else:
+                self._buffer = np.memmap(f"{self.path}.bin", dtype=np.uint8, mode="r")
+        return self._buffer
+
+    def is_valid(self, fingerprint: str) -> bool:
+        """
+        Whether the store was built from the posts identified by fingerprint.
+
+        Parameters
+        ----------
+        fingerprint : str
+
+        Returns
+        -------
+        bool
+        """
+        return self.fingerprint == fingerprint
+
+    def build(self, captions: Iterable[str], fingerprint: str):
+        """
+        Writes the captions to the store files, replacing the previous ones.
+
+        Parameters
+        ----------
+        captions : iterable of str
+        fingerprint : str
+            Identifies the posts the captions were built from.
+        """
+        offsets = [0]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            for caption in captions:
+                encoded = caption.encode("utf-8")
+                file.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        os.replace(tmp_path, f"{self.path}.bin")
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.fingerprint = fingerprint
+        self._buffer = None
+
+        with open(tmp_path, "wb") as file:
+            np.savez(file, offsets=self.offsets, fingerprint=np.array(fingerprint))
+        os.replace(tmp_path, f"{self.path}.npz")
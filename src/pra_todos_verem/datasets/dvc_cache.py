@@ -0,0 +1,437 @@
+"""
+Reading the #PraTodosVerem raw data straight from the DVC cache, without `dvc checkout`.
+"""
+import hashlib
+import json
+import os
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .manifest import IMAGE_EXTENSIONS, Manifest
+
+# the dvc command line accepts many targets, but not an unbounded number
+FETCH_BATCH_SIZE = 500
+
+
+def read_dvc_file(filepath: str) -> List[Dict]:
+    """
+    Reads the outputs of a .dvc pointer file.
+
+    Only the flat layout written by `dvc add` is supported:
+
+        outs:
+        - md5: 8c1e7ae51a5ce8ab29ba51e13a16235b
+          size: 2497
+          path: 0.jpg
+
+    Parameters
+    ----------
+    filepath : str
+
+    Returns
+    -------
+    list of dict
+        Each output with the keys md5, size and path.
+    """
+    outs = []
+    with open(filepath, "r") as file:
+        for line in file:
+            stripped = line.strip()
+            if stripped.startswith("- "):
+                outs.append({})
+                stripped = stripped[2:]
+            if not outs or ":" not in stripped:
+                continue
+
+            key, value = stripped.split(":", 1)
+            outs[-1][key.strip()] = value.strip()
+
+    for out in outs:
+        if "size" in out:
+            out["size"] = int(out["size"])
+    return outs
+
+
+def find_repo_root(path: str) -> Optional[str]:
+    """
+    Finds the DVC repository that contains path, i.e. the closest parent folder with a .dvc folder.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    str, optional
+    """
+    path = os.path.abspath(path)
+    while True:
+        if os.path.isdir(os.path.join(path, ".dvc")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class DVCCache:
+    """
+    Content-addressed DVC cache: each object is stored once, named by its md5.
+
+    Missing objects are downloaded from the DVC remote with `dvc fetch`, which fills the cache
+    without writing anything to the workspace. An object is fetched on its first access (object_path),
+    and, with prefetch=True, the objects missing from the index are fetched in bulk by DVCManifest.update.
+    Objects whose fetch failed are not fetched again, and nothing is fetched once dvc is found not to be installed.
+
+    Examples
+    --------
+    cache = DVCCache("data/raw/")
+    path = cache.object_path("8c1e7ae51a5ce8ab29ba51e13a16235b", "data/raw/linkedin/6986131346825859072/0.jpg.dvc")
+    """
+
+    def __init__(
+        self,
+        path: str = ".",
+        cache_dir: Optional[str] = None,
+        remote: Optional[str] = None,
+        prefetch: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        path : str
+            Any folder inside the DVC repository.
+        cache_dir : str, optional
+            Default: <repository>/.dvc/cache
+        remote : str, optional
+            DVC remote used to fetch missing objects. Default: the remote configured in the repository.
+        prefetch : bool
+            Fetches every object missing from the cache, in a single `dvc fetch`, when the manifest is updated.
+            Otherwise the images missing from the cache are left out of the index.
+        """
+        self.repo_root = find_repo_root(path)
+        if self.repo_root is None:
+            raise ValueError(f"{path} is not inside a DVC repository")
+
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(self.repo_root, ".dvc", "cache")
+        self.remote = remote
+        self.prefetch = prefetch
+
+        # md5s whose fetch failed, not fetched again
+        self.failed = set()
+        self.dvc_installed = True
+
+    def object_path(self, md5: str, dvc_file: Optional[str] = None) -> str:
+        """
+        Path of an object in the cache. If the object is missing and dvc_file is given, fetches it first,
+        unless a previous fetch of the object failed.
+
+        Parameters
+        ----------
+        md5 : str
+        dvc_file : str, optional
+            Pointer file of the object.
+
+        Returns
+        -------
+        str
+        """
+        if not self.contains(md5) and dvc_file is not None and md5 not in self.failed:
+            self.fetch([dvc_file])
+            if not self.contains(md5):
+                self.failed.add(md5)
+        return self.cached_path(md5)
+
+    def cached_path(self, md5: str) -> str:
+        """
+        Path of an object in the cache, whether it exists or not.
+
+        DVC 3 stores objects under files/md5/, older versions directly under the cache folder.
+
+        Parameters
+        ----------
+        md5 : str
+
+        Returns
+        -------
+        str
+        """
+        path = os.path.join(self.cache_dir, "files", "md5", md5[:2], md5[2:])
+        if os.path.exists(path):
+            return path
+        return os.path.join(self.cache_dir, md5[:2], md5[2:])
+
+    def contains(self, md5: str) -> bool:
+        return os.path.exists(self.cached_path(md5))
+
+    def fetch(self, dvc_files: List[str]) -> bool:
+        """
+        Downloads the objects of the given pointer files into the cache.
+
+        Parameters
+        ----------
+        dvc_files : list of str
+
+        Returns
+        -------
+        bool
+            False if dvc is not installed or the fetch failed.
+        """
+        if not self.dvc_installed:
+            return False
+
+        command = ["dvc", "fetch"]
+        if self.remote is not None:
+            command += ["--remote", self.remote]
+
+        for start in range(0, len(dvc_files), FETCH_BATCH_SIZE):
+            targets = [os.path.abspath(dvc_file) for dvc_file in dvc_files[start:start + FETCH_BATCH_SIZE]]
+            try:
+                subprocess.run(command + targets, cwd=self.repo_root, check=True)
+            except OSError as e:
+                print(e)
+                self.dvc_installed = False
+                return False
+            except subprocess.CalledProcessError as e:
+                print(e)
+                return False
+        return True
+
+
+class DVCManifest(Manifest):
+    """
+    Manifest built from the .dvc pointer files instead of the checked out files.
+
+    Besides the image sizes, stores the md5 of each image (key "md5") and of the caption of each post
+    (key "caption_md5"). Posts are indexed from the pointer files alone: the size of an image is read from
+    the header of its cached object once the object is in the cache, without scanning the post again.
+    Images missing from the cache are left out of posts, and captions missing from the cache are empty.
+    With DVCCache(prefetch=True), the missing objects are fetched in a single `dvc fetch`, and the objects
+    whose fetch failed are remembered in the manifest file and not fetched again.
+
+    Examples
+    --------
+    manifest = DVCManifest("data/raw/", DVCCache("data/raw/", prefetch=True))
+    manifest.update()
+    """
+
+    def __init__(self, root: str, cache: DVCCache, path: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        root : str
+            Root folder of the dataset.
+        cache : DVCCache
+        path : str, optional
+            Manifest file. Default: <root>/.manifest-dvc.json
+        """
+        self.cache = cache
+        super().__init__(root, path if path is not None else os.path.join(root, ".manifest-dvc.json"))
+
+    @property
+    def posts(self) -> List[Dict]:
+        """
+        Posts sorted by source and post id, without the images missing from the cache.
+        The caption_md5 of a caption missing from the cache is None.
+
+        Returns
+        -------
+        list of dict
+        """
+        posts = []
+        for post in super().posts:
+            caption_md5 = post["caption_md5"]
+            if caption_md5 is not None and not self.cache.contains(caption_md5):
+                caption_md5 = None
+            posts.append(
+                {
+                    **post,
+                    "caption_md5": caption_md5,
+                    "images": [image for image in post["images"] if image["width"] is not None],
+                }
+            )
+        return posts
+
+    def load(self):
+        """
+        Reads the manifest file, if it exists, and the objects whose fetch failed.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as file:
+            state = json.load(file)
+        self.sources = state["sources"]
+        self.cache.failed.update(state.get("failed", []))
+
+    def save(self):
+        """
+        Writes the manifest file and the objects whose fetch failed atomically.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"sources": self.sources, "failed": sorted(self.cache.failed)}, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def update(self) -> bool:
+        """
+        Brings the manifest up to date with the pointer files under root and the DVC cache,
+        and saves it if anything changed.
+
+        Returns
+        -------
+        bool
+            True if the manifest changed.
+        """
+        changed = super().update()
+        dirty = self.read_sizes()
+
+        missing = [(md5, dvc_file) for md5, dvc_file in self.missing_objects() if md5 not in self.cache.failed]
+        if self.cache.prefetch and missing:
+            print(f"Fetching {len(missing)} objects missing from the DVC cache...")
+            self.cache.fetch([dvc_file for _, dvc_file in missing])
+            self.cache.failed.update(md5 for md5, _ in missing if not self.cache.contains(md5))
+            self.read_sizes()
+            dirty = True
+
+        skipped = sum(image["width"] is None for post in super().posts for image in post["images"])
+        if skipped:
+            print(f"Skipping {skipped} images missing from the DVC cache...")
+
+        if dirty:
+            try:
+                self.save()
+            except OSError as e:
+                print(e)
+
+        return changed or dirty
+
+    def read_sizes(self) -> bool:
+        """
+        Reads the size of the images whose object arrived in the cache since they were indexed.
+
+        Returns
+        -------
+        bool
+            True if any image changed.
+        """
+        changed = False
+        for post in super().posts:
+            for image in list(post["images"]):
+                if image["width"] is not None or not self.cache.contains(image["md5"]):
+                    continue
+
+                try:
+                    with Image.open(self.cache.cached_path(image["md5"])) as pil_image:
+                        image["width"], image["height"] = pil_image.size
+                except OSError as e:
+                    print(e)
+                    print(f"Skipping {os.path.join(post['source'], post['post_id'], image['filename'])}...")
+                    post["images"].remove(image)
+                changed = True
+        return changed
+
+    def missing_objects(self) -> List[Tuple[str, str]]:
+        """
+        Objects of the indexed images and captions missing from the cache.
+
+        Returns
+        -------
+        list of tuple
+            (md5, pointer file).
+        """
+        missing = []
+        for post in super().posts:
+            post_path = os.path.join(self.root, post["source"], post["post_id"])
+            for image in post["images"]:
+                if image["width"] is None and not self.cache.contains(image["md5"]):
+                    missing.append((image["md5"], os.path.join(post_path, f"{image['filename']}.dvc")))
+            if post["caption_md5"] is not None and not self.cache.contains(post["caption_md5"]):
+                missing.append((post["caption_md5"], os.path.join(post_path, "caption.txt.dvc")))
+        return missing
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the md5s of the indexed images and captions. Differs from the fingerprint of a Manifest
+        of the checked out files, so their caption stores and image caches are never mixed up.
+
+        Returns
+        -------
+        str
+        """
+        digest = hashlib.md5(b"dvc\n")
+        for post in self.posts:
+            md5s = ",".join(image["md5"] for image in post["images"])
+            digest.update(f"{post['source']}/{post['post_id']}/{post['caption_md5']}/{md5s}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def file_mtime(self, filepath: str) -> Optional[int]:
+        """
+        mtime of the pointer file of a file of a post, in nanoseconds. None if it does not exist.
+
+        Parameters
+        ----------
+        filepath : str
+
+        Returns
+        -------
+        int, optional
+        """
+        return super().file_mtime(f"{filepath}.dvc")
+
+    def scan_post(self, source: str, post_id: str, mtime: int) -> Dict:
+        """
+        Reads the pointer files of a post folder. The image sizes are read later, by read_sizes.
+
+        Parameters
+        ----------
+        source : str
+        post_id : str
+        mtime : int
+            Folder mtime, in nanoseconds.
+
+        Returns
+        -------
+        dict
+        """
+        images = []
+        caption_md5 = None
+        caption_mtime = None
+        for entry in os.scandir(os.path.join(self.root, source, post_id)):
+            if not entry.name.endswith(".dvc"):
+                continue
+
+            filename = entry.name[:-len(".dvc")]
+            if filename != "caption.txt" and not filename.endswith(IMAGE_EXTENSIONS):
+                continue
+
+            outs = read_dvc_file(entry.path)
+            if len(outs) != 1 or "md5" not in outs[0]:
+                continue
+
+            if filename == "caption.txt":
+                caption_md5 = outs[0]["md5"]
+                caption_mtime = entry.stat().st_mtime_ns
+                continue
+
+            images.append(
+                {
+                    "filename": filename,
+                    "width": None,
+                    "height": None,
+                    "mtime": entry.stat().st_mtime_ns,
+                    "md5": outs[0]["md5"],
+                }
+            )
+
+        images.sort(key=lambda image: (len(image["filename"]), image["filename"]))
+        return {
+            "source": source,
+            "post_id": post_id,
+            "mtime": mtime,
+            "caption_mtime": caption_mtime,
+            "images": images,
+            "caption_md5": caption_md5,
+        }
@@ -0,0 +1,148 @@
+"""
+Cache of decoded, resized images backed by memory-mapped arrays.
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def resized_shape(width: int, height: int, image_size: int) -> Tuple[int, int]:
+    """
+    Shape (height, width) of an image resized so that its longer side is image_size, keeping its aspect ratio.
+
+    Parameters
+    ----------
+    width : int
+    height : int
+    image_size : int
+
+    Returns
+    -------
+    tuple
+    """
+    scale = image_size / max(width, height)
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+class ImageCache:
+    """
+    Decoded images (uint8, height x width x 3) stored back to back in one memory-mapped file.
+
+    Files:
+    - <path>.bin : the pixels of all images.
+    - <path>.filled : one byte per image, set once the image was written.
+    - <path>.npz : offset and shape of each image, and a fingerprint of the images the cache was built for.
+
+    The files are allocated upfront (sparse) and filled lazily: the first epoch decodes and writes each image,
+    the following epochs read it straight from the memory map. Several processes (e.g. DataLoader workers)
+    can fill the cache at the same time, since each image has its own region.
+
+    Examples
+    --------
+    cache = ImageCache("data/raw/.image_cache-256", shapes, fingerprint)
+    array = cache.get(3)
+    if array is None:
+        cache.put(3, decode(3))
+    """
+
+    def __init__(self, path: str, shapes: np.ndarray, fingerprint: str):
+        """
+        Parameters
+        ----------
+        path : str
+            Path prefix of the cache files.
+        shapes : numpy.ndarray
+            (height, width) of each cached image, shape (N, 2).
+        fingerprint : str
+            Identifies the images. The cache is recreated if it was built for another fingerprint.
+        """
+        self.path = path
+        self.shapes = np.asarray(shapes, dtype=np.int64).reshape(-1, 2)
+        sizes = self.shapes[:, 0] * self.shapes[:, 1] * 3
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.fingerprint = fingerprint
+
+        self._data = None
+        self._filled = None
+
+        if not self.is_valid():
+            self.create()
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        state["_filled"] = None
+        return state
+
+    def is_valid(self) -> bool:
+        """
+        Whether the cache files exist and were created for the same images.
+
+        Returns
+        -------
+        bool
+        """
+        if not all(os.path.exists(f"{self.path}{ext}") for ext in (".npz", ".bin", ".filled")):
+            return False
+
+        with np.load(f"{self.path}.npz") as data:
+            return str(data["fingerprint"]) == self.fingerprint and np.array_equal(data["shapes"], self.shapes)
+
+    def create(self):
+        """
+        Allocates empty cache files, replacing the previous ones.
+        """
+        for ext, size in ((".bin", self.offsets[-1]), (".filled", len(self))):
+            with open(f"{self.path}{ext}", "wb") as file:
+                file.truncate(max(1, int(size)))
+
+        with open(f"{self.path}.npz", "wb") as file:
+            np.savez(file, shapes=self.shapes, fingerprint=np.array(self.fingerprint))
+
+    @property
+    def data(self) -> np.memmap:
+        if self._data is None:
+            self._data = np.memmap(f"{self.path}.bin", dtype=np.uint8, mode="r+")
+        return self._data
+
+    @property
+    def filled(self) -> np.memmap:
+        if self._filled is None:
+            self._filled = np.memmap(f"{self.path}.filled", dtype=np.uint8, mode="r+")
+        return self._filled
+
+    def get(self, index: int) -> Optional[np.ndarray]:
+        """
+        A view of a cached image, without copying it.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        numpy.ndarray, optional
+            uint8 array (height, width, 3), or None if the image is not cached yet.
+        """
+        if not self.filled[index]:
+            return None
+
+        height, width = self.shapes[index]
+        return self.data[self.offsets[index]:self.offsets[index + 1]].reshape(height, width, 3)
+
+    def put(self, index: int, array: np.ndarray):
+        """
+        Writes an image to the cache.
+
+        Parameters
+        ----------
+        index : int
+        array : numpy.ndarray
+            uint8 array with the shape of the image in the cache.
+        """
+        self.data[self.offsets[index]:self.offsets[index + 1]] = array.reshape(-1)
+        self.filled[index] = 1
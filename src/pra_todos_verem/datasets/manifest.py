@@ -0,0 +1,343 @@
+"""
+Persistent index of the #PraTodosVerem raw data.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from PIL import Image
+from tqdm import tqdm
+
+from ..data_collection.catalog import Catalog
+
+IMAGE_EXTENSIONS = (".jpg", ".png")
+
+
+class Manifest:
+    """
+    Index of the posts under root, persisted as a compact JSON file.
+
+    Expects the layout written by the crawlers: root/<source>/<post_id>/<files>.
+    For each post, stores its image files with their size (width, height) and mtime, and the mtime of caption.txt.
+
+    Validation is cheap: the post folders are listed and the known files are only stat'ed. A post is scanned
+    again only if it is new, or if the mtime of its folder, of one of its images or of its caption changed
+    (e.g. a caption edited in place, which does not change the folder mtime).
+
+    Examples
+    --------
+    manifest = Manifest("data/raw/")
+    manifest.update()
+    for post in manifest.posts:
+        print(post["source"], post["post_id"], post["images"])
+    """
+
+    def __init__(self, root: str, path: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        root : str
+            Root folder of the dataset.
+        path : str, optional
+            Manifest file. Default: <root>/.manifest.json
+        """
+        self.root = root
+        self.path = path if path is not None else os.path.join(root, ".manifest.json")
+
+        # {source: {"posts": {post_id: post}}}
+        self.sources = {}
+        self.load()
+
+    @property
+    def posts(self) -> List[Dict]:
+        """
+        Posts sorted by source and post id.
+
+        Returns
+        -------
+        list of dict
+            Each post has the keys: source, post_id, mtime, caption_mtime and images
+            (a list of dicts with the keys: filename, width, height, mtime).
+        """
+        return [
+            self.sources[source]["posts"][post_id]
+            for source in sorted(self.sources)
+            for post_id in sorted(self.sources[source]["posts"])
+        ]
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the indexed posts and their fingerprints. Changes whenever a post is added, removed or modified.
+
+        Returns
+        -------
+        str
+        """
+        digest = hashlib.md5()
+        for post in self.posts:
+            digest.update(f"{post['source']}/{post['post_id']}/{self.post_fingerprint(post)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def post_fingerprint(self, post: Dict) -> str:
+        """
+        The mtimes of the post folder, of its caption and of its images.
+
+        Parameters
+        ----------
+        post : dict
+
+        Returns
+        -------
+        str
+        """
+        mtimes = ",".join(str(image["mtime"]) for image in post["images"])
+        return f"{post['mtime']}/{post.get('caption_mtime')}/{mtimes}"
+
+    def load(self):
+        """
+        Reads the manifest file, if it exists.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as file:
+            self.sources = json.load(file)["sources"]
+
+    def save(self):
+        """
+        Writes the manifest file atomically.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"sources": self.sources}, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def update(self) -> bool:
+        """
+        Brings the manifest up to date with the files under root and saves it if anything changed.
+
+        Returns
+        -------
+        bool
+            True if the manifest changed.
+        """
+        changed = False
+
+        sources = {
+            entry.name: entry
+            for entry in os.scandir(self.root)
+            if entry.is_dir() and not entry.name.startswith(".")
+        }
+
+        for source in set(self.sources) - set(sources):
+            del self.sources[source]
+            changed = True
+
+        for source in sources:
+            known = self.sources.get(source, {}).get("posts", {})
+            posts = self.scan_source(source, known)
+            if source not in self.sources or posts != known:
+                self.sources[source] = {"posts": posts}
+                changed = True
+
+        if changed:
+            try:
+                self.save()
+            except OSError as e:
+                # a read-only root still works, the manifest is only rebuilt on the next construction
+                print(e)
+
+        return changed
+
+    def scan_source(self, source: str, posts: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Lists the post folders of a source, reusing the known posts that did not change (see is_current).
+
+        Parameters
+        ----------
+        source : str
+        posts : dict
+            Known posts of the source, by post id.
+
+        Returns
+        -------
+        dict
+        """
+        entries = [
+            entry
+            for entry in os.scandir(os.path.join(self.root, source))
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+
+        updated = {}
+        for entry in tqdm(entries, desc=f"Indexing {source}"):
+            mtime = entry.stat().st_mtime_ns
+            post = posts.get(entry.name)
+            if post is None or not self.is_current(source, post, mtime):
+                post = self.scan_post(source, entry.name, mtime)
+            updated[entry.name] = post
+
+        return updated
+
+    def is_current(self, source: str, post: Dict, mtime: int) -> bool:
+        """
+        Whether a known post did not change: same folder mtime and same mtime of each of its images and caption.
+
+        Parameters
+        ----------
+        source : str
+        post : dict
+        mtime : int
+            Folder mtime, in nanoseconds.
+
+        Returns
+        -------
+        bool
+        """
+        if post["mtime"] != mtime:
+            return False
+
+        post_path = os.path.join(self.root, source, post["post_id"])
+        if self.file_mtime(os.path.join(post_path, "caption.txt")) != post.get("caption_mtime"):
+            return False
+        return all(
+            self.file_mtime(os.path.join(post_path, image["filename"])) == image["mtime"] for image in post["images"]
+        )
+
+    def file_mtime(self, filepath: str) -> Optional[int]:
+        """
+        mtime of a file of a post, in nanoseconds. None if the file does not exist.
+
+        Parameters
+        ----------
+        filepath : str
+
+        Returns
+        -------
+        int, optional
+        """
+        try:
+            return os.stat(filepath).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def scan_post(self, source: str, post_id: str, mtime: int) -> Dict:
+        """
+        Lists the image files of a post folder and reads their size from the image header.
+
+        Parameters
+        ----------
+        source : str
+        post_id : str
+        mtime : int
+            Folder mtime, in nanoseconds.
+
+        Returns
+        -------
+        dict
+        """
+        images = []
+        for entry in os.scandir(os.path.join(self.root, source, post_id)):
+            if not entry.name.endswith(IMAGE_EXTENSIONS):
+                continue
+
+            # Image.open only reads the header, the pixels are not decoded
+            try:
+                with Image.open(entry.path) as image:
+                    width, height = image.size
+            except OSError as e:
+                print(e)
+                print(f"Skipping {entry.path}...")
+                continue
+
+            images.append(
+                {
+                    "filename": entry.name,
+                    "width": width,
+                    "height": height,
+                    "mtime": entry.stat().st_mtime_ns,
+                }
+            )
+
+        images.sort(key=lambda image: (len(image["filename"]), image["filename"]))
+        return {
+            "source": source,
+            "post_id": post_id,
+            "mtime": mtime,
+            "caption_mtime": self.file_mtime(os.path.join(self.root, source, post_id, "caption.txt")),
+            "images": images,
+        }
+
+
+class CatalogManifest(Manifest):
+    """
+    Index of the posts read from the SQLite catalog written by the crawlers. The catalog is opened read-only.
+
+    A single query returns every post with its images, caption and image sizes, so the post folders
+    are never listed nor opened. Posts also carry their caption (key "caption").
+
+    Examples
+    --------
+    manifest = CatalogManifest("data/raw/")
+    for post in manifest.posts:
+        print(post["source"], post["post_id"], post["caption"])
+    """
+
+    def __init__(self, root: str, path: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        root : str
+            Root folder of the dataset.
+        path : str, optional
+            Catalog file. Default: <root>/.catalog.sqlite
+        """
+        self.catalog = Catalog(
+            path if path is not None else os.path.join(root, ".catalog.sqlite"), root=root, read_only=True
+        )
+        super().__init__(root, self.catalog.path)
+
+    def load(self):
+        """
+        Reads the posts from the catalog.
+        """
+        self.sources = {}
+        for post in self.catalog.read_posts():
+            source = self.sources.setdefault(post["source"], {"posts": {}})
+            source["posts"][post["post_id"]] = {
+                "source": post["source"],
+                "post_id": post["post_id"],
+                # the collection time changes whenever a post is saved again
+                "mtime": post["collected_at"],
+                "caption": post["caption"],
+                "images": [
+                    {"filename": image["filename"], "width": image["width"], "height": image["height"]}
+                    for image in post["images"]
+                    if image["filename"].endswith(IMAGE_EXTENSIONS) and image["width"] is not None
+                ],
+            }
+
+    def post_fingerprint(self, post: Dict) -> str:
+        """
+        The collection time of the post, which changes whenever the post is saved again.
+        """
+        return post["mtime"]
+
+    def save(self):
+        """
+        The catalog is written by the crawlers only.
+        """
+
+    def update(self) -> bool:
+        """
+        Reads the catalog again.
+
+        Returns
+        -------
+        bool
+            True if the posts changed.
+        """
+        fingerprint = self.fingerprint()
+        self.load()
+        return self.fingerprint() != fingerprint
@@ -1,12 +1,48 @@
 """
 """
-import glob
 import os
+from typing import Callable, List, Optional, Tuple
 
+import numpy as np
+import torch
 from PIL import Image
 from torch.utils.data import Dataset
 from torchvision import transforms
-from tqdm import tqdm
+
+from .captions import CaptionStore
+from .image_cache import ImageCache, resized_shape
+from .dvc_cache import DVCCache, DVCManifest
+from .manifest import CatalogManifest, Manifest
+from .sample_index import SampleIndex
+
+
+def open_image(filepath: str, size: Optional[Tuple[int, int]] = None):
+    """
+    Decodes an image as RGB, optionally resized.
+
+    JPEG draft mode makes the decoder skip the DCT coefficients it does not need, so a large JPEG is
+    decoded at the smallest 1/2, 1/4 or 1/8 scale that is still at least the target size. Other formats
+    are reduced by an integer factor before the final (bilinear) resize.
+
+    Parameters
+    ----------
+    filepath : str
+    size : tuple, optional
+        (width, height). Default: the original size.
+
+    Returns
+    -------
+    PIL.Image.Image
+    """
+    image = Image.open(filepath)
+    if size is None:
+        return image.convert("RGB")
+
+    image.draft("RGB", size)
+    image = image.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return image
 
 
 class PraTodosVerem(Dataset):
@@ -33,6 +69,14 @@ class PraTodosVerem(Dataset):
     def __init__(
         self,
         root: str = "data/raw/",
+        manifest_path: Optional[str] = None,
+        captions_path: Optional[str] = None,
+        image_cache_size: Optional[int] = None,
+        image_cache_path: Optional[str] = None,
+        image_size: Optional[int] = None,
+        transform: Optional[Callable] = None,
+        dvc_cache: Optional[DVCCache] = None,
+        catalog_path: Optional[str] = None,
     ):
         """
         #PraTodosVerem dataset.
@@ -41,64 +85,205 @@ class PraTodosVerem(Dataset):
         ----------
         root : str
             Diretório raiz do dataset #PraTodosVerem.
+        manifest_path : str, optional
+            Persistent index of the samples. Default: <root>/.manifest.json (<root>/.manifest-dvc.json with dvc_cache)
+        captions_path : str, optional
+            Path prefix of the memory-mapped caption store. Default: <root>/.captions
+        image_cache_size : int, optional
+            Enables the decoded image cache: images are resized once so that their longer side has
+            image_cache_size pixels, and served from a memory-mapped array afterwards.
+        image_cache_path : str, optional
+            Path prefix of the image cache files. Default: <root>/.image_cache-<image_cache_size>
+        image_size : int, optional
+            Resizes images so that their longer side has image_size pixels. JPEGs are decoded directly
+            at a reduced scale (1/2, 1/4 or 1/8) before the final resize. Default: original size.
+        transform : callable, optional
+            Applied to the image tensor (1, 3, height, width), e.g. torchvision transforms.
+        dvc_cache : DVCCache, optional
+            Reads the images and captions from the DVC cache, using the .dvc pointer files under root,
+            instead of the checked out files.
+        catalog_path : str, optional
+            Builds the index from the SQLite catalog written by the crawlers (e.g. <root>/.catalog.sqlite),
+            with a single query instead of listing the post folders. Captions are read from the catalog too.
         """
         self.root = root
+        self.image_size = image_size
+        self.transform = transform
+        self.dvc_cache = dvc_cache
+        if catalog_path is not None:
+            manifest = CatalogManifest(root, catalog_path)
+        elif dvc_cache is not None:
+            manifest = DVCManifest(root, dvc_cache, manifest_path)
+        else:
+            manifest = Manifest(root, manifest_path)
+        self.captions = CaptionStore(
+            captions_path if captions_path is not None else os.path.join(root, ".captions")
+        )
 
-        self.ids = []
-        self.load_ids()
+        # only the fingerprint and the flat arrays of the index are kept: the per-post dicts of the manifest
+        # would be copied (refcounts) by every DataLoader worker that touches them
+        self.fingerprint = None
+        self.index = None
+        self.load_ids(manifest)
+
+        self.image_cache = None
+        if image_cache_size is not None:
+            self.image_cache = ImageCache(
+                image_cache_path
+                if image_cache_path is not None
+                else os.path.join(root, f".image_cache-{image_cache_size}"),
+                [resized_shape(int(width), int(height), image_cache_size) for width, height in self.sizes],
+                self.fingerprint,
+            )
 
     def __len__(self) -> int:
-        return len(self.ids)
+        return len(self.index)
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """
+        (width, height) of each sample, shape (N, 2).
+        """
+        return self.index.sizes
 
     def __getitem__(self, index: int):
-        id_ = self.ids[index]
-        image = self.load_image(id_)
-        target = self.load_target(id_)
+        target = self.load_target(index)
+
+        if self.image_cache is not None:
+            img = self.load_cached_image(index)
+        else:
+            image = self.load_image(index)
+            img = self.to_tensor(image)
 
-        img = self.to_tensor(image)
+        if self.transform is not None:
+            img = self.transform(img)
 
         return img, target
 
     def to_tensor(self, image):
-        return transforms.ToTensor()(image).unsqueeze_(0)
+        return transforms.functional.to_tensor(image).unsqueeze_(0)
 
-    def load_ids(self):
+    @property
+    def ids(self) -> List[str]:
+        """
+        Id of each sample: <post_id>_<ordinal>. Built from the index on each access, prefer index.sample_id(i).
         """
-        Iterates through .jpg and .png files in self.root and saves their ids.
+        return [self.index.sample_id(i) for i in range(len(self.index))]
+
+    def load_ids(self, manifest: Manifest):
         """
-        for filepath in tqdm(glob.iglob(f"{self.root}**/*.*", recursive=True)):
-            dirname, filename = os.path.split(filepath[:-4])
-            _, ext = os.path.splitext(filename)
+        Builds the sample index of the .jpg and .png files in self.root from the persistent manifest.
 
-            if ext in {".jpg", ".png"}:
-                id_ = f"{os.path.basename(dirname)}_{filename}"
-                self.ids.append(id_)
+        The manifest is updated first, scanning only the post folders that are new or changed.
+        The caption store is rebuilt whenever the posts changed. Each sample points to the caption of its post.
 
-    def load_image(self, id: str):
+        Parameters
+        ----------
+        manifest : Manifest
         """
-        Loads an image into a Tensor object.
+        manifest.update()
+        posts = manifest.posts
+
+        fingerprint = manifest.fingerprint()
+        self.fingerprint = fingerprint
+        if not self.captions.is_valid(fingerprint):
+            self.captions.build(
+                (
+                    post["caption"]
+                    if "caption" in post
+                    else self.read_caption(post["source"], post["post_id"], post.get("caption_md5"))
+                    for post in posts
+                ),
+                fingerprint,
+            )
+
+        self.index = SampleIndex.from_posts(posts)
+
+    def load_image(self, index: int, size: Optional[Tuple[int, int]] = None):
+        """
+        Loads an image, resized to size or to image_size (see open_image).
 
         Parameters
         ----------
-        id : str
+        index : int
+        size : tuple, optional
+            (width, height). Default: the size given by image_size, or the original size.
+
+        Returns
+        -------
+        PIL.Image.Image
+        """
+        if size is None and self.image_size is not None:
+            width, height = self.sizes[index]
+            height, width = resized_shape(int(width), int(height), self.image_size)
+            size = (width, height)
+
+        filepath = os.path.join(self.root, self.index.filepath(index))
+        if self.dvc_cache is not None:
+            filepath = self.dvc_cache.object_path(self.index.digest(index), f"{filepath}.dvc")
+        return open_image(filepath, size)
+
+    def load_cached_image(self, index: int) -> torch.Tensor:
+        """
+        Loads an image from the decoded image cache, decoding and caching it on first access.
+
+        The tensor shares memory with the memory-mapped cache up to the conversion to float.
+
+        Parameters
+        ----------
+        index : int
 
         Returns
         -------
         torch.Tensor
+            Same layout as to_tensor: (1, 3, height, width), values in [0, 1].
+        """
+        array = self.image_cache.get(index)
+        if array is None:
+            height, width = self.image_cache.shapes[index]
+            image = self.load_image(index, (int(width), int(height)))
+            self.image_cache.put(index, np.asarray(image))
+            array = self.image_cache.get(index)
+
+        return torch.from_numpy(array).permute(2, 0, 1).unsqueeze(0).float().div_(255)
+
+    def load_target(self, index: int) -> str:
         """
-        filepath = id.replace("_", "/")
-        return Image.open(os.path.join(self.root, filepath)).convert("RGB")
+        Loads the description text from the caption store, without any file I/O.
+
+        Parameters
+        ----------
+        index : int
 
-    def load_target(self, id: str) -> str:
+        Returns
+        -------
+        str
         """
-        Loads the description text.
+        return self.captions[self.index.caption_indices[index]]
+
+    def read_caption(self, source: str, post_id: str, md5: Optional[str] = None) -> str:
+        """
+        Reads the caption.txt of a post.
 
         Parameters
         ----------
-        id : str
+        source : str
+        post_id : str
+        md5 : str, optional
+            md5 of the caption, to read it from the DVC cache.
 
         Returns
         -------
         str
         """
-        return open(os.path.join(self.root, id.split("_")[0], "caption.txt"), "r").read()
+        filepath = os.path.join(self.root, source, post_id, "caption.txt")
+        if self.dvc_cache is not None:
+            if md5 is None:
+                return ""
+            # captions are not fetched one by one: a caption missing from the cache is empty (see DVCManifest)
+            filepath = self.dvc_cache.cached_path(md5)
+        if not os.path.exists(filepath):
+            return ""
+
+        with open(filepath, "r") as file:
+            return file.read()
@@ -0,0 +1,188 @@
+"""
+Array-backed index of the #PraTodosVerem samples.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .manifest import IMAGE_EXTENSIONS
+
+
+def parse_int(text: str):
+    """
+    Parses a canonical non-negative integer ("42", not "042" or "4_2").
+
+    Parameters
+    ----------
+    text : str
+
+    Returns
+    -------
+    int, optional
+        None if text is not a canonical integer.
+    """
+    if not text.isdigit() or str(int(text)) != text:
+        return None
+    return int(text)
+
+
+class SampleIndex:
+    """
+    One row per sample (image), stored in NumPy arrays instead of Python objects.
+
+    DataLoader workers forked from the main process share these arrays: reading them does not touch
+    reference counts, so their pages are never copied into the workers. Strings (ids and paths) are
+    built on demand.
+
+    Expects the file names written by the crawlers: numeric post ids and images named <ordinal><extension>.
+    Other files are skipped.
+
+    Examples
+    --------
+    index = SampleIndex.from_posts(manifest.posts)
+    print(index.sample_id(3), index.filepath(3))
+    """
+
+    def __init__(
+        self,
+        sources: List[str],
+        source_codes: np.ndarray,
+        post_ids: np.ndarray,
+        ordinals: np.ndarray,
+        extension_codes: np.ndarray,
+        sizes: np.ndarray,
+        caption_indices: np.ndarray,
+        digests: Optional[np.ndarray] = None,
+    ):
+        """
+        Parameters
+        ----------
+        sources : list of str
+            Source names, indexed by source_codes.
+        source_codes : numpy.ndarray
+        post_ids : numpy.ndarray
+        ordinals : numpy.ndarray
+            Number of the image within its post (file name without extension).
+        extension_codes : numpy.ndarray
+            Index of the file extension in IMAGE_EXTENSIONS.
+        sizes : numpy.ndarray
+            (width, height) of each image, shape (N, 2).
+        caption_indices : numpy.ndarray
+            Index of the caption of each image, i.e. the index of its post.
+        digests : numpy.ndarray, optional
+            md5 of each image, shape (N, 16), when the images are read from the DVC cache.
+        """
+        self.sources = sources
+        self.source_codes = source_codes
+        self.post_ids = post_ids
+        self.ordinals = ordinals
+        self.extension_codes = extension_codes
+        self.sizes = sizes
+        self.caption_indices = caption_indices
+        self.digests = digests
+
+    @classmethod
+    def from_posts(cls, posts: List[Dict]) -> "SampleIndex":
+        """
+        Builds the index from the posts of a Manifest.
+
+        Parameters
+        ----------
+        posts : list of dict
+            As in Manifest.posts. The caption index of each sample is the index of its post in this list.
+            If the images have a "md5" key (DVCManifest), the index also stores their digests.
+
+        Returns
+        -------
+        SampleIndex
+        """
+        sources = sorted({post["source"] for post in posts})
+        source_codes = {source: code for code, source in enumerate(sources)}
+
+        has_digests = any("md5" in image for post in posts for image in post["images"])
+
+        rows = []
+        digests = []
+        for caption_index, post in enumerate(posts):
+            post_id = parse_int(post["post_id"])
+            for image in post["images"]:
+                stem, extension = os.path.splitext(image["filename"])
+                ordinal = parse_int(stem)
+                if post_id is None or ordinal is None or extension not in IMAGE_EXTENSIONS:
+                    print(f"Skipping {os.path.join(post['source'], post['post_id'], image['filename'])}...")
+                    continue
+
+                rows.append(
+                    (
+                        source_codes[post["source"]],
+                        post_id,
+                        ordinal,
+                        IMAGE_EXTENSIONS.index(extension),
+                        image["width"],
+                        image["height"],
+                        caption_index,
+                    )
+                )
+                digests.append(bytes.fromhex(image.get("md5", "0" * 32)))
+
+        table = np.array(rows, dtype=np.int64).reshape(-1, 7)
+        return cls(
+            sources=sources,
+            source_codes=table[:, 0].astype(np.uint8),
+            post_ids=table[:, 1].copy(),
+            ordinals=table[:, 2].astype(np.int32),
+            extension_codes=table[:, 3].astype(np.uint8),
+            sizes=table[:, 4:6].astype(np.int32),
+            caption_indices=table[:, 6].astype(np.int32),
+            digests=np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, 16).copy() if has_digests else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.post_ids)
+
+    def sample_id(self, index: int) -> str:
+        """
+        Id of a sample: <post_id>_<ordinal>.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        str
+        """
+        return f"{self.post_ids[index]}_{self.ordinals[index]}"
+
+    def filepath(self, index: int) -> str:
+        """
+        Path of the image of a sample, relative to the dataset root: <source>/<post_id>/<ordinal><extension>.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        str
+        """
+        return os.path.join(
+            self.sources[self.source_codes[index]],
+            str(self.post_ids[index]),
+            f"{self.ordinals[index]}{IMAGE_EXTENSIONS[self.extension_codes[index]]}",
+        )
+
+    def digest(self, index: int) -> str:
+        """
+        md5 of the image of a sample, as a hex string.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        str
+        """
+        return self.digests[index].tobytes().hex()
@@ -0,0 +1,267 @@
+"""
+Packed shard format for the #PraTodosVerem raw data.
+
+Packs the post folders (images, caption.txt and author.txt) into a few large, uncompressed tar files,
+plus an index with the offset of each image and caption inside its shard. The shards are plain tar files
+(`tar tf shard-00000.tar` lists the posts) and are read back by memory-mapping, without per-file open/stat.
+
+Examples
+--------
+python -m pra_todos_verem.datasets.shards \
+    --root data/raw/ \
+    --output_path data/shards/ \
+    --max_shard_size 256
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import sys
+import tarfile
+from typing import Dict, Tuple
+
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import transforms
+from tqdm import tqdm
+
+from .manifest import Manifest
+
+DESCRIPTION = "Empacota os dados 'raw' do #PraTodosVerem em shards"
+
+INDEX_FILENAME = "index.json"
+
+
+def pack_shards(root: str, output_path: str, max_shard_size: int = 256 * 2**20) -> Dict:
+    """
+    Packs the posts under root into tar shards of up to max_shard_size bytes, and writes their index.
+
+    A post is never split across shards.
+
+    Parameters
+    ----------
+    root : str
+        Root folder of the raw dataset.
+    output_path : str
+        Folder where the shards and the index are written.
+    max_shard_size : int
+        In bytes.
+
+    Returns
+    -------
+    dict
+        The index: {"shards": [filenames], "samples": [[shard, image_offset, image_size,
+        caption_offset, caption_size, filepath], ...]}
+    """
+    manifest = Manifest(root)
+    manifest.update()
+
+    os.makedirs(output_path, exist_ok=True)
+
+    shards = []
+    samples = []
+    tar = None
+    for post in tqdm(manifest.posts, desc="Packing"):
+        if tar is None or tar.offset >= max_shard_size:
+            if tar is not None:
+                tar.close()
+            shards.append(f"shard-{len(shards):05d}.tar")
+            tar = tarfile.open(os.path.join(output_path, shards[-1]), mode="w", format=tarfile.GNU_FORMAT)
+
+        post_path = os.path.join(post["source"], post["post_id"])
+        offsets = {}
+        for entry in sorted(os.scandir(os.path.join(root, post_path)), key=lambda entry: entry.name):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+
+            offsets[entry.name] = add_file(tar, entry.path, os.path.join(post_path, entry.name))
+
+        caption_offset, caption_size = offsets.get("caption.txt", (0, 0))
+        for image in post["images"]:
+            image_offset, image_size = offsets[image["filename"]]
+            samples.append(
+                [
+                    len(shards) - 1,
+                    image_offset,
+                    image_size,
+                    caption_offset,
+                    caption_size,
+                    os.path.join(post_path, image["filename"]),
+                ]
+            )
+
+    if tar is not None:
+        tar.close()
+
+    index = {"shards": shards, "samples": samples}
+    with open(os.path.join(output_path, INDEX_FILENAME), "w") as file:
+        json.dump(index, file, separators=(",", ":"))
+
+    return index
+
+
+def add_file(tar: tarfile.TarFile, filepath: str, arcname: str) -> Tuple[int, int]:
+    """
+    Adds a file to a tar and returns where its data starts.
+
+    Parameters
+    ----------
+    tar : tarfile.TarFile
+    filepath : str
+    arcname : str
+
+    Returns
+    -------
+    tuple
+        (offset, size) of the file data inside the tar.
+    """
+    tarinfo = tar.gettarinfo(filepath, arcname=arcname)
+    with open(filepath, "rb") as file:
+        tar.addfile(tarinfo, file)
+
+    # the data is padded to blocks of 512 bytes and ends at the current tar offset
+    padded_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+    return tar.offset - padded_size, tarinfo.size
+
+
+class PraTodosVeremShards(Dataset):
+    """
+    #PraTodosVerem Dataset read from packed shards.
+
+    The shards are memory-mapped lazily in each process (e.g. DataLoader workers). Samples are stored in
+    shard order, so iterating over the indices in order reads each shard sequentially.
+
+    Examples
+    --------
+    import pra_todos_verem.datasets as datasets
+    ptv = datasets.PraTodosVeremShards(root='data/shards/')
+
+    img, target = ptv[3] # load 4th sample
+    """
+
+    def __init__(self, root: str = "data/shards/"):
+        """
+        Parameters
+        ----------
+        root : str
+            Folder with the shards and their index, as written by pack_shards.
+        """
+        self.root = root
+
+        with open(os.path.join(root, INDEX_FILENAME), "r") as file:
+            index = json.load(file)
+
+        self.shards = index["shards"]
+        self.samples = index["samples"]
+        self.filepaths = [sample[5] for sample in self.samples]
+        self.ids = []
+        for filepath in self.filepaths:
+            dirname, filename = os.path.split(filepath)
+            self.ids.append(f"{os.path.basename(dirname)}_{os.path.splitext(filename)[0]}")
+
+        self._mmaps = {}
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, index: int):
+        image = self.load_image(index)
+        target = self.load_target(index)
+
+        img = self.to_tensor(image)
+
+        return img, target
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_mmaps"] = {}
+        return state
+
+    def to_tensor(self, image):
+        return transforms.ToTensor()(image).unsqueeze_(0)
+
+    def shard(self, shard: int) -> mmap.mmap:
+        """
+        Memory-maps a shard, on first access.
+
+        Parameters
+        ----------
+        shard : int
+
+        Returns
+        -------
+        mmap.mmap
+        """
+        if shard not in self._mmaps:
+            with open(os.path.join(self.root, self.shards[shard]), "rb") as file:
+                self._mmaps[shard] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmaps[shard]
+
+    def read(self, shard: int, offset: int, size: int) -> bytes:
+        return self.shard(shard)[offset:offset + size]
+
+    def load_image(self, index: int):
+        """
+        Loads an image from its shard.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        PIL.Image.Image
+        """
+        shard, offset, size, _, _, _ = self.samples[index]
+        return Image.open(io.BytesIO(self.read(shard, offset, size))).convert("RGB")
+
+    def load_target(self, index: int) -> str:
+        """
+        Loads the description text from the shard of the sample.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        str
+        """
+        shard, _, _, offset, size, _ = self.samples[index]
+        return self.read(shard, offset, size).decode("utf-8")
+
+
+def parse_args(args):
+    """
+    Recebe argumentos stdin e organiza em parâmetros.
+    """
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default="data/raw/",
+        help="Diretório dos dados 'raw'",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="data/shards/",
+        help="Diretório onde salvar os shards e o índice",
+    )
+    parser.add_argument(
+        "--max_shard_size",
+        type=int,
+        default=256,
+        help="Tamanho máximo de cada shard, em MB",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    index = pack_shards(args.root, args.output_path, args.max_shard_size * 2**20)
+    print(f"Packed {len(index['samples'])} samples into {len(index['shards'])} shards")
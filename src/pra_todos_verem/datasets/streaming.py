@@ -0,0 +1,334 @@
+"""
+Streaming variant of the #PraTodosVerem dataset.
+"""
+import os
+import random
+import time
+import zlib
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import IterableDataset, get_worker_info
+from torchvision import transforms
+
+from .image_cache import resized_shape
+from .manifest import Manifest
+from .pra_todos_verem import open_image
+
+
+def get_world_size() -> int:
+    """
+    Number of distributed ranks, 1 without torch.distributed.
+    """
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_world_size()
+    return 1
+
+
+def get_slot() -> Tuple[int, int]:
+    """
+    Which part of the data the current process reads: one slot per DataLoader worker of each distributed rank.
+    The slots of a rank are consecutive.
+
+    Returns
+    -------
+    tuple
+        (slot, num_slots)
+    """
+    rank, world_size = 0, get_world_size()
+    if world_size > 1:
+        rank = dist.get_rank()
+
+    worker_id, num_workers = 0, 1
+    worker_info = get_worker_info()
+    if worker_info is not None:
+        worker_id, num_workers = worker_info.id, worker_info.num_workers
+
+    return rank * num_workers + worker_id, world_size * num_workers
+
+
+def shuffle_buffer(iterable, size: int, rng: random.Random) -> Iterator:
+    """
+    Approximate shuffle: keeps up to size items and yields a random one as each new item arrives.
+
+    Parameters
+    ----------
+    iterable : iterable
+    size : int
+    rng : random.Random
+
+    Returns
+    -------
+    iterator
+    """
+    buffer = []
+    for item in iterable:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+
+        index = rng.randrange(size)
+        yield buffer[index]
+        buffer[index] = item
+
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class PraTodosVeremStream(IterableDataset):
+    """
+    #PraTodosVerem Dataset read as a stream of posts.
+
+    Posts are read in manifest order (source, post id), i.e. sequentially, and assigned to DataLoader workers
+    and distributed ranks by their position, so each post is read by exactly one process. Under DDP, every rank
+    yields the same number of samples, its workers repeating some of their own if needed (as DistributedSampler
+    pads the indices): a rank that runs out of samples early would leave the others waiting in the collectives.
+    On a single rank, each sample is yielded exactly once per epoch, whatever the number of workers.
+
+    With follow=True, the stream never ends: once the known posts are exhausted, the manifest is updated every
+    poll_interval seconds and the new posts are read. Posts are then assigned by a hash of their id, so the
+    assignment does not change as new posts are collected, and the ranks are not balanced: use
+    torch.distributed.algorithms.Join (model.join()) when training with DDP.
+
+    Examples
+    --------
+    import pra_todos_verem.datasets as datasets
+    from torch.utils.data import DataLoader
+
+    stream = datasets.PraTodosVeremStream(root='data/raw/', image_size=256, shuffle_buffer=1000)
+    for img, target in DataLoader(stream, batch_size=None, num_workers=4):
+        ...
+    """
+
+    def __init__(
+        self,
+        root: str = "data/raw/",
+        manifest_path: Optional[str] = None,
+        image_size: Optional[int] = None,
+        transform: Optional[Callable] = None,
+        shuffle_buffer: int = 0,
+        follow: bool = False,
+        poll_interval: float = 60.0,
+        seed: int = 0,
+    ):
+        """
+        Parameters
+        ----------
+        root : str
+            Root folder of the raw dataset.
+        manifest_path : str, optional
+            Persistent index of the samples. Default: <root>/.manifest.json
+        image_size : int, optional
+            Resizes images so that their longer side has image_size pixels. Default: original size.
+        transform : callable, optional
+            Applied to the image tensor (1, 3, height, width).
+        shuffle_buffer : int
+            Number of decoded samples kept to shuffle the stream. 0 keeps the manifest order.
+        follow : bool
+            Keeps waiting for newly collected posts instead of ending.
+        poll_interval : float
+            Seconds between manifest updates, when following.
+        seed : int
+        """
+        self.root = root
+        self.manifest_path = manifest_path
+        self.image_size = image_size
+        self.transform = transform
+        self.shuffle_buffer = shuffle_buffer
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.seed = seed
+        self.epoch = 0
+
+        # the manifest is updated once, here. the workers read this snapshot instead of scanning the folders again
+        manifest = Manifest(root, manifest_path)
+        manifest.update()
+        self.posts = manifest.posts
+
+    def __iter__(self):
+        slot, num_slots = get_slot()
+
+        samples = self.iter_samples(slot, num_slots)
+        if self.shuffle_buffer > 1:
+            rng = random.Random(f"{self.seed}-{self.epoch}-{slot}")
+            samples = shuffle_buffer(samples, self.shuffle_buffer, rng)
+
+        for img, target in samples:
+            if self.transform is not None:
+                img = self.transform(img)
+            yield img, target
+
+    def set_epoch(self, epoch: int):
+        """
+        Sets the epoch, so that each epoch is shuffled differently.
+
+        Parameters
+        ----------
+        epoch : int
+        """
+        self.epoch = epoch
+
+    def iter_posts(self, slot: int, num_slots: int) -> Iterator[Dict]:
+        """
+        Yields the posts assigned to a slot, in manifest order. When following, waits for new posts.
+
+        Parameters
+        ----------
+        slot : int
+        num_slots : int
+
+        Returns
+        -------
+        iterator of dict
+            Posts, as in Manifest.posts.
+        """
+        if not self.follow:
+            yield from self.posts[slot::num_slots]
+            return
+
+        # only the first slot updates the manifest file, the others just read it
+        manifest = Manifest(self.root, self.manifest_path)
+        seen = set()
+        while True:
+            if slot == 0:
+                manifest.update()
+            else:
+                manifest.load()
+
+            new_posts = 0
+            for post in manifest.posts:
+                key = f"{post['source']}/{post['post_id']}"
+                if key in seen or zlib.crc32(key.encode("utf-8")) % num_slots != slot:
+                    continue
+
+                seen.add(key)
+                new_posts += 1
+                yield post
+
+            if new_posts == 0:
+                time.sleep(self.poll_interval)
+
+    def num_samples(self, slot: int, num_slots: int) -> int:
+        """
+        Number of images of the posts assigned to a slot (when not following).
+        """
+        return sum(len(post["images"]) for post in self.posts[slot::num_slots])
+
+    def padded_num_samples(self, slot: int, num_slots: int, world_size: int = 1) -> int:
+        """
+        Number of samples a slot yields (when not following): its own images, plus its share of the padding
+        that brings its rank to the number of images of the rank with the most images.
+
+        The padding of a rank is split among its slots that have images. With world_size=1 there is no padding.
+
+        Parameters
+        ----------
+        slot : int
+        num_slots : int
+        world_size : int
+            Number of distributed ranks. Each rank has num_slots // world_size consecutive slots.
+
+        Returns
+        -------
+        int
+        """
+        num_workers = num_slots // world_size
+        counts = [self.num_samples(other, num_slots) for other in range(num_slots)]
+        rank_counts = [sum(counts[rank * num_workers:(rank + 1) * num_workers]) for rank in range(world_size)]
+
+        rank = slot // num_workers
+        padding = max(rank_counts) - rank_counts[rank]
+        slots = [other for other in range(rank * num_workers, (rank + 1) * num_workers) if counts[other] > 0]
+        if padding == 0 or slot not in slots:
+            return counts[slot]
+
+        index = slots.index(slot)
+        return counts[slot] + padding // len(slots) + (1 if index < padding % len(slots) else 0)
+
+    def iter_samples(self, slot: int, num_slots: int) -> Iterator[Tuple[torch.Tensor, str]]:
+        """
+        Decodes the images of the posts assigned to a slot.
+
+        When not following, yields padded_num_samples samples, starting over from its first post if needed,
+        so that every distributed rank yields the same number of samples.
+
+        Parameters
+        ----------
+        slot : int
+        num_slots : int
+
+        Returns
+        -------
+        iterator of tuple
+            (image tensor (1, 3, height, width), caption)
+        """
+        if self.follow:
+            yield from self.decode_posts(self.iter_posts(slot, num_slots))
+            return
+
+        total = self.padded_num_samples(slot, num_slots, get_world_size())
+        count = 0
+        while count < total:
+            decoded = 0
+            for sample in self.decode_posts(self.iter_posts(slot, num_slots)):
+                if count == total:
+                    return
+                yield sample
+                count += 1
+                decoded += 1
+
+            if decoded == 0:
+                # no readable image in this slot
+                return
+
+    def decode_posts(self, posts: Iterator[Dict]) -> Iterator[Tuple[torch.Tensor, str]]:
+        """
+        Decodes the images of the given posts.
+
+        Parameters
+        ----------
+        posts : iterator of dict
+
+        Returns
+        -------
+        iterator of tuple
+            (image tensor (1, 3, height, width), caption)
+        """
+        for post in posts:
+            post_path = os.path.join(self.root, post["source"], post["post_id"])
+            target = self.read_caption(post_path)
+
+            for image in post["images"]:
+                size = None
+                if self.image_size is not None:
+                    height, width = resized_shape(image["width"], image["height"], self.image_size)
+                    size = (width, height)
+
+                try:
+                    pil_image = open_image(os.path.join(post_path, image["filename"]), size)
+                except OSError as e:
+                    # the post may have been removed or rewritten since the manifest update
+                    print(e)
+                    continue
+
+                yield transforms.functional.to_tensor(pil_image).unsqueeze_(0), target
+
+    def read_caption(self, post_path: str) -> str:
+        """
+        Reads the caption.txt of a post.
+
+        Parameters
+        ----------
+        post_path : str
+
+        Returns
+        -------
+        str
+        """
+        filepath = os.path.join(post_path, "caption.txt")
+        if not os.path.exists(filepath):
+            return ""
+
+        with open(filepath, "r") as file:
+            return file.read()